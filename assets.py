@@ -0,0 +1,286 @@
+'''
+This file contains the asset manager shared by both entry points (main.py and main_pygbag.py).
+
+Every image and font is loaded the first time it is asked for, and only once:
+images are converted to the display format when they are loaded, and derived images
+(e.g. the rotated hat shown on hover) are made from the cached copy and cached as well.
+Assets that aren't needed for the first frame can be preloaded in the background with preload_steps():
+the worker only decodes them, and they are converted on the main loop when they are added, since converting
+a surface uses the display, which SDL doesn't allow from other threads.
+How long each asset took to load is recorded, so startup time can be checked with --stats.
+
+Assets can also be packed into a single bundle file (assets.bundle), so the app opens one file
+instead of every image and font (in the browser build, each of those is a separate fetch).
+Images are stored in the bundle already decoded, as raw BGRA pixels (the pixel format of converted
+images with per-pixel alpha), and the bundle is memory-mapped copy-on-write, so loading an image just wraps
+its pixels in a surface without copying or decoding them, and drawing on that surface only changes the app's copy.
+Anything missing from the bundle, or the whole bundle if it hasn't been built, is loaded from the loose files instead,
+and so is any file that has changed since the bundle was built (the bundle records when each one was modified).
+The bundle is built from the loose files, and should be built again when they change:
+
+Usage: python3 assets.py [--out assets.bundle] [FILE ...]
+
+Dependencies: Pygame
+Install: python3 -m pip install -U pygame --user
+For more information: https://www.pygame.org/wiki/GettingStarted
+'''
+import pygame
+import io
+import json
+import os
+import struct
+import time
+
+BUNDLE_PATH = 'assets.bundle' #bundle loaded by the asset manager, if it exists
+BUNDLE_ASSETS = ['Images', 'Delius-Regular.ttf'] #files packed by default, a folder packs every image in it
+BUNDLE_MAGIC = b'ASSETS02' #start of every bundle file, followed by the length of its index
+BUNDLE_ALIGN = 16 #every asset starts at a multiple of this many bytes
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def bundle_files(paths) -> list:
+    '''
+    Takes files and folders, and returns the files and every image in the folders, sorted.
+    '''
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [f'{path}/{name}' for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS)]
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def build_bundle(out_path, paths) -> dict:
+    '''
+    Packs the files at paths into a bundle at out_path, decoding images to raw BGRA pixels.
+    Other files (fonts) are stored as they are. The index also has the modified time of every file,
+    so a file that is changed later is loaded from the file instead. Returns the bundle's index.
+    A bundle is BUNDLE_MAGIC, the length of the index (4 bytes, little-endian), the index as JSON,
+    and then every asset, starting at the offsets given in the index.
+    '''
+    index = {}
+    blobs = []
+    offset = 0
+    for path in paths:
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            image = pygame.image.load(path)
+            data = pygame.image.tobytes(image, 'BGRA')
+            index[path] = {'offset': offset, 'length': len(data), 'size': image.get_size(), 'format': 'BGRA'}
+        else:
+            with open(path, 'rb') as file:
+                data = file.read()
+            index[path] = {'offset': offset, 'length': len(data)}
+        index[path]['mtime_ns'] = os.stat(path).st_mtime_ns
+        padding = -len(data) % BUNDLE_ALIGN
+        blobs.append(data + bytes(padding))
+        offset += len(data) + padding
+    header = json.dumps(index).encode()
+    #the assets start aligned from the start of the file too
+    header += b' ' * (-(len(BUNDLE_MAGIC) + 4 + len(header)) % BUNDLE_ALIGN)
+    with open(out_path, 'wb') as file:
+        file.write(BUNDLE_MAGIC + struct.pack('<I', len(header)) + header)
+        for data in blobs:
+            file.write(data)
+    return index
+
+
+class AssetBundle():
+    '''
+        A bundle file built by build_bundle(), memory-mapped when it can be, or else read in one go.
+        Surfaces made by image() share the bundle's memory, so the bundle is never closed.
+        That memory is writable (the mapping is copy-on-write), since anything drawn on a surface is written to it.
+    '''
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            try:
+                import mmap
+                self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+            except (ImportError, OSError, ValueError):
+                #no mmap (e.g. in the browser), one read is still better than a file per asset
+                self.buffer = bytearray(file.read())
+        view = memoryview(self.buffer)
+        if bytes(view[:len(BUNDLE_MAGIC)]) != BUNDLE_MAGIC:
+            raise ValueError(f'{path} is not an asset bundle')
+        start = len(BUNDLE_MAGIC) + 4
+        (length,) = struct.unpack('<I', view[len(BUNDLE_MAGIC):start])
+        self.index = json.loads(bytes(view[start:start+length]))
+        self.data_start = start + length
+        self.view = view
+
+    def __contains__(self, path) -> bool:
+        '''
+            Returns true if the bundle has path and the file hasn't been modified since the bundle was built.
+            A file that isn't there (e.g. in the browser, where only the bundle is shipped) is taken from the bundle.
+        '''
+        entry = self.index.get(path)
+        if entry is None:
+            return False
+        try:
+            return os.stat(path).st_mtime_ns == entry['mtime_ns']
+        except OSError:
+            return True
+
+    def data(self, path) -> memoryview:
+        '''
+            Returns the bytes stored for path, without copying them.
+        '''
+        entry = self.index[path]
+        start = self.data_start + entry['offset']
+        return self.view[start:start+entry['length']]
+
+    def image(self, path) -> pygame.Surface:
+        '''
+            Returns the image stored for path, as a surface using the bundle's memory for its pixels.
+        '''
+        entry = self.index[path]
+        return pygame.image.frombuffer(self.data(path), entry['size'], entry['format'])
+
+
+def open_bundle(path):
+    '''
+    Returns the AssetBundle at path, or None if there isn't a usable one.
+    '''
+    try:
+        return AssetBundle(path)
+    except (OSError, ValueError):
+        return None
+
+
+class AssetManager():
+    '''
+        Loads images and fonts on demand and keeps them, keyed on their file name.
+        They are taken from the bundle at bundle_path when it has them, and loaded from their files otherwise.
+        Records the time taken to load or make every asset in load_times.
+    '''
+    def __init__(self, bundle_path=BUNDLE_PATH):
+        self.bundle = open_bundle(bundle_path) if bundle_path else None
+        self.images = {} # (path, alpha): surface converted to the display format
+        self.derived = {} # (path, transform, arguments): surface made from a cached image
+        self.fonts = {} # (path, size): font
+        self.load_times = {} # name of every asset: seconds taken to load it
+
+    def image(self, path, alpha=True):
+        '''
+            Returns the image at path, converted for fast blitting (with per-pixel alpha unless alpha is false).
+        '''
+        key = (path, alpha)
+        surface = self.images.get(key)
+        if surface is None:
+            start = time.perf_counter()
+            surface = self.load_image(path, alpha)
+            self.images[key] = surface
+            self.load_times[path] = time.perf_counter() - start
+        return surface
+
+    def load_image(self, path, alpha=True):
+        '''
+            Loads and converts an image without caching it. Only called from the main loop.
+        '''
+        return self.convert_image(path, self.decode_image(path), alpha)
+
+    def decode_image(self, path):
+        '''
+            Returns the image at path as it is stored, without converting it or touching the cache,
+            so it can run on a worker thread. Raises pygame.error or OSError if it can't be loaded.
+        '''
+        if self.bundle is not None and path in self.bundle:
+            return self.bundle.image(path)
+        return pygame.image.load(path)
+
+    def convert_image(self, path, surface, alpha=True):
+        '''
+            Converts the image decoded from path to the display format. Uses the display, so only called from the main loop.
+            An image from the bundle is already in the format convert_alpha() gives on little-endian machines,
+            so it is only converted (copied) when the display's format is different, or when it has no alpha.
+        '''
+        if self.bundle is not None and path in self.bundle and alpha \
+                and surface.get_masks()[:3] == pygame.display.get_surface().get_masks()[:3]:
+            return surface
+        return surface.convert_alpha() if alpha else surface.convert()
+
+    def rotated(self, path, angle):
+        '''
+            Returns the image at path rotated by angle degrees (anticlockwise), made from the cached image.
+        '''
+        key = (path, 'rotate', angle)
+        surface = self.derived.get(key)
+        if surface is None:
+            image = self.image(path)
+            start = time.perf_counter()
+            surface = pygame.transform.rotate(image, angle)
+            self.derived[key] = surface
+            self.load_times[f'{path} rotated {angle}'] = time.perf_counter() - start
+        return surface
+
+    def font(self, path, size):
+        '''
+            Returns the font at path in a size.
+        '''
+        key = (path, size)
+        font = self.fonts.get(key)
+        if font is None:
+            start = time.perf_counter()
+            if self.bundle is not None and path in self.bundle:
+                font = pygame.font.Font(io.BytesIO(self.bundle.data(path)), size)
+            else:
+                font = pygame.font.Font(path, size)
+            self.fonts[key] = font
+            self.load_times[f'{path} {size}pt'] = time.perf_counter() - start
+        return font
+
+    def preload_steps(self, paths):
+        '''
+            A generator for a worker job (see worker.py) that decodes each image in paths that isn't cached yet,
+            yielding after each one. Returns {path: (decoded surface, seconds taken)} to be passed to add().
+            An image that can't be loaded is left out, so the rest are still preloaded;
+            asking for it with image() raises the error on the main loop.
+        '''
+        loaded = {}
+        for path in paths:
+            if (path, True) not in self.images:
+                start = time.perf_counter()
+                try:
+                    loaded[path] = (self.decode_image(path), time.perf_counter() - start)
+                except (pygame.error, OSError) as error:
+                    print(f'could not preload {path}: {error}')
+                yield
+        return loaded
+
+    def add(self, loaded):
+        '''
+            Converts the images decoded by preload_steps() and adds them to the cache, unless they were loaded since.
+            Called from the main loop.
+        '''
+        for path, (surface, seconds) in loaded.items():
+            if (path, True) not in self.images:
+                start = time.perf_counter()
+                self.images[(path, True)] = self.convert_image(path, surface)
+                self.load_times[path] = seconds + time.perf_counter() - start
+
+    def report(self) -> str:
+        '''
+            Returns the load times as a human-readable string, slowest first.
+        '''
+        total = sum(self.load_times.values())
+        source = 'from ' + BUNDLE_PATH if self.bundle is not None else 'from files'
+        lines = [f'{len(self.load_times)} assets loaded {source} in {total*1000:.1f} ms']
+        for name, seconds in sorted(self.load_times.items(), key=lambda item: -item[1]):
+            lines.append(f'  {seconds*1000:7.1f} ms  {name}')
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    #the asset paths are relative to this folder
+    invoked_from = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description='Pack images and fonts into a single asset bundle.')
+    parser.add_argument('files', nargs='*', default=BUNDLE_ASSETS, help='files and folders of images to pack (default: Images and the font)')
+    parser.add_argument('--out', default=BUNDLE_PATH, help=f'bundle to write (default: {BUNDLE_PATH})')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    index = build_bundle(os.path.join(invoked_from, args.out), bundle_files(args.files))
+    size = os.path.getsize(os.path.join(invoked_from, args.out))
+    print(f'{len(index)} assets packed into {args.out} ({size/1024:.0f} KiB) in {time.perf_counter()-start:.2f}s')
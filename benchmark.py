@@ -0,0 +1,271 @@
+'''
+Benchmarks for pattern generation, instructions and drawing.
+
+- knitting: generating patterns and their instructions for every setting the sliders offer,
+  and tiling, summarising and writing out garments.
+- scenes: frame times of Setting_Scene.run and Pattern_Scene.run (and Pattern_Scene.draw_pattern),
+  drawn headless with SDL's dummy video driver, with patterns made on the main loop so every run does the same work.
+- batch: generating every pattern of a parameter grid one at a time with knitting.generate_pattern()
+  against generating them all at once with knitting.generate_patterns().
+
+The knitting and scene timings are saved to a JSON file and compared against a stored baseline (if there is one),
+and timings more than REGRESSION_THRESHOLD slower than the baseline are reported as regressions.
+Save a baseline with --save-baseline, on the same machine the benchmarks will be compared on.
+
+Usage: python3 benchmark.py [knitting] [scenes] [batch] [--out benchmark_results.json] [--baseline benchmark_baseline.json] [--save-baseline]
+
+Dependencies: Pygame, NumPy
+Install: python3 -m pip install -U pygame numpy --user
+For more information: https://www.pygame.org/wiki/GettingStarted
+'''
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+import numpy as np
+import knitting
+
+RESULTS_PATH = 'benchmark_results.json' #where timings are saved
+BASELINE_PATH = 'benchmark_baseline.json' #timings the results are compared against
+REGRESSION_THRESHOLD = 0.15 #a timing this much slower than its baseline is a regression
+NOISE_FLOOR = 0.00002 #seconds, a timing has to be at least this much slower too (frames that do nothing vary a lot)
+SLIDER_SIZES = range(2, 9) #every spike size the slider offers
+SLIDER_DISTANCES = range(1, 5) #every spike distance the slider offers
+#garments (spike size, spike distance, cast on, rows) used to time garment-scale work
+GARMENTS = [(4, 2, 200, 1000), (4, 2, 1000, 20000)]
+FRAMES = 60 #frames timed for each scene benchmark
+SUITES = ['knitting', 'scenes', 'batch'] #benchmarks that can be run, all of them by default
+
+
+def best_time(func, repeat=5, number=1) -> float:
+    '''
+    Returns the best time (in seconds) of running func number times, out of repeat tries.
+    '''
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def scalar_patterns(heights, distances) -> list:
+    '''
+    Generates a pattern for every combination of the settings, one at a time.
+    '''
+    return [knitting.generate_pattern(int(b_height), int(b_dist)) for b_height in heights for b_dist in distances]
+
+
+def batch_patterns(heights, distances) -> knitting.PatternBatch:
+    '''
+    Generates a pattern for every combination of the settings, all at once.
+    '''
+    grid_heights, grid_distances = np.meshgrid(heights, distances, indexing='ij')
+    return knitting.generate_patterns(grid_heights, grid_distances)
+
+
+def benchmark_batch(grids) -> list:
+    '''
+    Times scalar and batch generation for every (name, heights, distances) grid.
+    Returns a list of (name, patterns, scalar seconds, batch seconds).
+    '''
+    results = []
+    for name, heights, distances in grids:
+        #make sure both give the same patterns before timing them
+        batch = batch_patterns(heights, distances)
+        assert list(batch.patterns()) == scalar_patterns(heights, distances)
+        scalar = best_time(lambda: scalar_patterns(heights, distances))
+        vector = best_time(lambda: batch_patterns(heights, distances))
+        results.append((name, len(batch), scalar, vector))
+    return results
+
+
+def frame_times(func, repeat=FRAMES) -> list:
+    '''
+    Returns the times (in seconds) of running func repeat times, e.g. once per frame.
+    '''
+    times = []
+    for n in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def benchmark_knitting() -> dict:
+    '''
+    Times the knitting.py functions across every setting the sliders offer, and at garment scale.
+    Returns {benchmark name: seconds}.
+    '''
+    settings = [(b_height, b_dist) for b_height in SLIDER_SIZES for b_dist in SLIDER_DISTANCES]
+    patterns = [knitting.generate_pattern(*setting) for setting in settings]
+    results = {
+        'knitting/generate_pattern slider grid': best_time(lambda: [knitting.generate_pattern(*setting) for setting in settings]),
+        'knitting/pattern_to_strarray slider grid': best_time(lambda: [knitting.pattern_to_strarray(pattern) for pattern in patterns]),
+    }
+    for b_height, b_dist, cast_on, length in GARMENTS:
+        name = f'{cast_on}x{length}'
+        garment = knitting.Garment(b_height, b_dist, cast_on, length)
+        results[f'knitting/Garment {name}'] = best_time(lambda: knitting.Garment(b_height, b_dist, cast_on, length))
+        results[f'knitting/pattern_to_strarray garment {name}'] = best_time(lambda: knitting.pattern_to_strarray(garment, repeat=False), repeat=3)
+        for format in knitting.WRITERS:
+            results[f'knitting/write_pattern {format} garment {name}'] = best_time(lambda: knitting.write_pattern(garment, io.StringIO(), format), repeat=3)
+    return results
+
+
+def benchmark_scenes() -> dict:
+    '''
+    Times frames of both scenes of the app, headless. Returns {benchmark name: seconds per frame}.
+    Frames that do the same work every time are timed by the fastest of FRAMES frames, like best_time(),
+    and first frames (which each do different work) by their median.
+    '''
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    import pygame
+    import main
+    #patterns and chart tiles are made during the frame that needs them, so every run does the same work
+    main.BACKGROUND_WORK = False
+    app = main.App()
+    setting_scene = app.setting_scene
+    pattern_scene = app.pattern_scene
+    scene_manager = app.scene_manager
+    results = {}
+
+    def full_redraw(scene):
+        scene.redraw()
+        scene.run()
+
+    #settings scene: drawing all of it, a frame where nothing changed, and dragging a slider
+    setting_scene.run()
+    results['scenes/Setting_Scene.run full redraw'] = min(frame_times(lambda: full_redraw(setting_scene)))
+    results['scenes/Setting_Scene.run idle'] = min(frame_times(setting_scene.run))
+    slider = setting_scene.height_slider
+    x, y = int(slider.slider_posX), int(slider.slider_posY + slider.slider_size)
+    setting_scene.handle_event(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(x, y), button=1))
+    moves = iter(range(FRAMES))
+    def drag():
+        setting_scene.handle_event(pygame.event.Event(pygame.MOUSEMOTION, pos=(x + next(moves) * 4, y), rel=(4, 0), buttons=(1, 0, 0)))
+        setting_scene.run()
+    results['scenes/Setting_Scene.run slider drag'] = min(frame_times(drag))
+    setting_scene.handle_event(pygame.event.Event(pygame.MOUSEBUTTONUP, pos=(x, y), button=1))
+
+    #pattern scene: the first frame for every setting the sliders offer, which generates the pattern
+    #and renders its chart, and then drawing it all again from the caches
+    scene_manager.setScene('pattern')
+    settings = [(b_height, b_dist) for b_height in SLIDER_SIZES for b_dist in SLIDER_DISTANCES]
+    def first_frame(setting):
+        scene_manager.setPattern('8 ply', *setting)
+        full_redraw(pattern_scene)
+    results['scenes/Pattern_Scene.run first frame'] = statistics.median(frame_times(lambda: first_frame(settings.pop()), len(settings)))
+    scene_manager.setPattern('8 ply', 4, 2)
+    full_redraw(pattern_scene)
+    results['scenes/Pattern_Scene.run full redraw'] = min(frame_times(lambda: full_redraw(pattern_scene)))
+    results['scenes/Pattern_Scene.run idle'] = min(frame_times(pattern_scene.run))
+    entry = scene_manager.getPattern()
+    results['scenes/Pattern_Scene.draw_pattern'] = min(frame_times(lambda: pattern_scene.draw_pattern(entry)))
+
+    #moving the chart view around, zoomed in on the pattern and on a garment
+    for garment in (False, True):
+        pattern_scene.show_garment = garment
+        pattern_scene.viewport = None
+        full_redraw(pattern_scene)
+        for n in range(3):
+            pattern_scene.handle_event(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_PLUS, mod=0, unicode='+', scancode=0))
+        keys = iter([pygame.K_RIGHT, pygame.K_DOWN, pygame.K_LEFT, pygame.K_UP] * FRAMES)
+        def pan():
+            pattern_scene.handle_event(pygame.event.Event(pygame.KEYDOWN, key=next(keys), mod=0, unicode='', scancode=0))
+            pattern_scene.run()
+        results[f'scenes/Pattern_Scene.run pan {"garment" if garment else "pattern"}'] = min(frame_times(pan))
+    pygame.quit()
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD, noise_floor=NOISE_FLOOR) -> list:
+    '''
+    Compares timings against baseline timings.
+    Returns (name, baseline seconds, seconds, change as a fraction, regressed) for every timing in both,
+    where regressed means more than threshold and noise_floor slower.
+    '''
+    rows = []
+    for name, seconds in results.items():
+        if name in baseline:
+            change = seconds / baseline[name] - 1
+            regressed = change > threshold and seconds - baseline[name] > noise_floor
+            rows.append((name, baseline[name], seconds, change, regressed))
+    return rows
+
+
+def save_results(path, results):
+    '''
+    Saves timings to a JSON file, with what they were measured on.
+    '''
+    import pygame
+    with open(path, 'w') as file:
+        json.dump({
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'numpy': np.__version__,
+            'machine': f'{platform.system()} {platform.machine()} {platform.processor()}'.strip(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'results': results,
+        }, file, indent=1)
+
+
+if __name__ == '__main__':
+    import argparse
+    #the app's fonts and images are relative to this folder
+    invoked_from = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    parser = argparse.ArgumentParser(description='Benchmark pattern generation, instructions and drawing.')
+    parser.add_argument('suites', nargs='*', help=f'benchmarks to run: {", ".join(SUITES)} (default: all)')
+    parser.add_argument('--out', default=RESULTS_PATH, help=f'file to save the timings to (default: {RESULTS_PATH})')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help=f'timings to compare against (default: {BASELINE_PATH})')
+    parser.add_argument('--save-baseline', action='store_true', help='save the timings as the baseline too')
+    args = parser.parse_args()
+    #checked here, argparse checks a list default against choices as a single value
+    for suite in args.suites:
+        if suite not in SUITES:
+            parser.error(f'unknown benchmark {suite!r}, choose from {", ".join(SUITES)}')
+    suites = args.suites or SUITES
+
+    results = {}
+    if 'knitting' in suites:
+        results.update(benchmark_knitting())
+    if 'scenes' in suites:
+        results.update(benchmark_scenes())
+    regressions = 0
+    if results:
+        baseline_path = os.path.join(invoked_from, args.baseline)
+        baseline = {}
+        if os.path.exists(baseline_path):
+            with open(baseline_path) as file:
+                baseline = json.load(file)['results']
+        changes = {name: (base, change, regressed) for name, base, seconds, change, regressed in compare(results, baseline)}
+        print(f'{"benchmark":<52} {"ms":>10} {"baseline":>10} {"change":>8}')
+        for name, seconds in results.items():
+            if name in changes:
+                base, change, regressed = changes[name]
+                print(f'{name:<52} {seconds*1000:>10.3f} {base*1000:>10.3f} {change*100:>+7.1f}%' + ('  REGRESSION' if regressed else ''))
+            else:
+                print(f'{name:<52} {seconds*1000:>10.3f}')
+        save_results(os.path.join(invoked_from, args.out), results)
+        if args.save_baseline:
+            save_results(baseline_path, results)
+        regressions = sum(regressed for base, change, regressed in changes.values())
+        if regressions:
+            print(f'{regressions} timings are more than {REGRESSION_THRESHOLD*100:.0f}% slower than {args.baseline}')
+        elif not baseline:
+            print('no baseline to compare against, save one with --save-baseline')
+
+    if 'batch' in suites:
+        grids = [
+            ('slider grid', range(2, 9), range(1, 5)),
+            ('scaled x4', range(2, 33), range(1, 17)),
+            ('scaled x16', range(2, 129), range(1, 65)),
+        ]
+        print(f'{"grid":<12} {"patterns":>8} {"scalar ms":>10} {"batch ms":>10} {"speedup":>8}')
+        for name, patterns, scalar, vector in benchmark_batch(grids):
+            print(f'{name:<12} {patterns:>8} {scalar*1000:>10.2f} {vector*1000:>10.2f} {scalar/vector:>7.1f}x')
+    #a regression fails the run, e.g. in CI
+    sys.exit(1 if regressions else 0)
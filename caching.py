@@ -0,0 +1,166 @@
+'''
+This file contains small caches used by the GUI so that work which only depends on the
+pattern settings (spike size, spike distance) is done once instead of every frame.
+'''
+from collections import OrderedDict
+import knitting
+import profiler
+
+
+class PatternEntry():
+    '''
+        Everything derived from one set of pattern settings:
+        the generated pattern, its instruction strings and its chart size.
+        The yarn only changes the needle size, so it isn't part of the settings.
+    '''
+    def __init__(self, b_height, b_dist):
+        self.b_height = b_height
+        self.b_dist = b_dist
+        with profiler.span('generate pattern'):
+            self.pattern = knitting.generate_pattern(b_height, b_dist)
+            self.instructions = knitting.pattern_to_strarray(self.pattern)
+        #chart size, used to scale the chart to the window
+        self.height = self.pattern.height
+        self.width = self.pattern.width
+
+
+class PatternCache():
+    '''
+        Least recently used cache of PatternEntry objects,
+        keyed on (b_height, b_dist).
+        Holds at most max_size entries, the oldest one is dropped first.
+    '''
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, b_height, b_dist) -> PatternEntry:
+        '''
+            Returns the PatternEntry for these settings, generating it if it isn't cached.
+        '''
+        entry = self.find(b_height, b_dist)
+        if entry is None:
+            entry = PatternEntry(b_height, b_dist)
+            self.add(entry)
+        return entry
+
+    def find(self, b_height, b_dist):
+        '''
+            Returns the cached PatternEntry for these settings, or None if it isn't cached.
+        '''
+        key = (b_height, b_dist)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def add(self, entry):
+        '''
+            Adds a PatternEntry generated elsewhere (e.g. by a background worker).
+        '''
+        self.entries[(entry.b_height, entry.b_dist)] = entry
+        # evict the least recently used entries
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+class SurfaceCache():
+    '''
+        Least recently used cache of pre-rendered pygame surfaces.
+        make is called to render a surface the first time its key is asked for.
+        Counts hits and misses so the cache can be checked to be doing its job.
+    '''
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, make):
+        '''
+            Returns the surface for key, calling make() to render it if it isn't cached.
+        '''
+        surface = self.find(key)
+        if surface is None:
+            surface = make()
+            self.put(key, surface)
+        return surface
+
+    def find(self, key):
+        '''
+            Returns the surface for key, or None if it isn't cached.
+        '''
+        surface = self.entries.get(key)
+        if surface is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return surface
+
+    def put(self, key, surface):
+        '''
+            Adds a surface rendered elsewhere (e.g. by a background worker).
+        '''
+        self.entries[key] = surface
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+class TextCache(SurfaceCache):
+    '''
+        Least recently used cache of rendered text, keyed on (font, text, colour, antialias).
+        Rendering text with a font is slow, and most text in the GUI is the same every frame.
+    '''
+    def __init__(self, max_size=256):
+        super().__init__(max_size)
+
+    def render(self, font, text, antialias, color):
+        '''
+            Same as font.render(text, antialias, color) but reuses previously rendered text.
+        '''
+        key = (font, text, color, antialias)
+        surface = self.find(key)
+        if surface is None:
+            with profiler.span('render text'):
+                surface = font.render(text, antialias, color)
+            self.put(key, surface)
+        return surface
+
+
+class TileCache():
+    '''
+        Cache of pre-rendered chart tiles, with a SurfaceCache of tiles for each zoom level.
+        Zooming only ever looks at one level at a time, so whole levels are evicted together:
+        at most max_levels levels are kept, the least recently used one is dropped first,
+        and each level holds at most max_tiles tiles.
+    '''
+    def __init__(self, max_levels=8, max_tiles=48):
+        self.max_levels = max_levels
+        self.max_tiles = max_tiles
+        self.levels = OrderedDict()
+
+    def level(self, key) -> SurfaceCache:
+        '''
+            Returns the cache of tiles for one zoom level (e.g. keyed on the chart and the zoom), creating it if needed.
+        '''
+        tiles = self.levels.get(key)
+        if tiles is None:
+            tiles = SurfaceCache(self.max_tiles)
+            self.levels[key] = tiles
+            while len(self.levels) > self.max_levels:
+                self.levels.popitem(last=False)
+        else:
+            self.levels.move_to_end(key)
+        return tiles
+
+    def stats(self) -> dict:
+        '''
+            Returns the number of levels and tiles cached, and the tile hits and misses of the cached levels.
+        '''
+        return {
+            'levels': len(self.levels),
+            'tiles': sum(len(tiles.entries) for tiles in self.levels.values()),
+            'hits': sum(tiles.hits for tiles in self.levels.values()),
+            'misses': sum(tiles.misses for tiles in self.levels.values())
+        }
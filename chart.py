@@ -0,0 +1,327 @@
+'''
+This file draws the stitch symbols (see symbols.py) used in knitting charts and the chart legend.
+Each symbol is drawn once per chart scale into a GlyphAtlas, then charts are put together
+by blitting those symbols in one batch.
+A Viewport shows a zoomable, scrollable part of a chart, drawn in tiles so only what is visible is drawn.
+
+Dependencies: Pygame
+Install: python3 -m pip install -U pygame --user
+For more information: https://www.pygame.org/wiki/GettingStarted
+'''
+import pygame
+import symbols
+import profiler
+import math
+
+LINE_WEIGHT = 2 #line weight of the stitch boxes, symbols are drawn one pixel thicker
+STITCH_WIDTHS = symbols.STITCH_WIDTHS #how many chart cells each stitch covers
+TILE_SIZE = 256 #size of the square tiles a Viewport draws the chart in, in pixels
+ZOOM_STEP = 1.25 #how much larger each zoom level draws the chart
+MIN_SCALE = 4 #smallest size of a chart cell when zoomed out, in pixels
+MAX_SCALE = 64 #largest size of a chart cell when zoomed in, in pixels
+PLACEHOLDER_COLOR = (235,235,235) #colour of tiles that are still being rendered
+TILE_CHUNK_ROWS = 8 #chart rows drawn in each step of rendering a tile in the background
+
+
+class GlyphAtlas():
+    '''
+        Holds a surface for every stitch symbol, drawn at one chart scale (cell size in pixels).
+        A symbol for a cell at (x, y) is blitted at (x - LINE_WEIGHT/2, y - LINE_WEIGHT/2)
+        so its box lines are centred on the cell edges.
+        The symbols are drawn without the display, so an atlas can be made on a worker thread,
+        and converted to the display format later with convert().
+    '''
+    def __init__(self, scale):
+        self.scale = scale
+        self.ofst = LINE_WEIGHT/2 #offset squares to accomodate for line weight
+        self.converted = False
+        self.glyphs = {}
+        for stitch in STITCH_WIDTHS:
+            if stitch != ' ':
+                self.glyphs[stitch] = self.draw_glyph(stitch)
+
+    def draw_glyph(self, stitch):
+        '''
+            Draws the symbol for one stitch onto a new surface, white is transparent.
+            Returns the surface.
+        '''
+        scale = self.scale
+        ofst = self.ofst
+        l_weight = LINE_WEIGHT
+        box = int(scale + l_weight) #size of one box, including its line weight
+        width = STITCH_WIDTHS[stitch]
+        glyph = pygame.Surface((int(scale * (width - 1)) + box + 1, box + 1), 0, 32)
+        glyph.fill((255,255,255))
+        glyph.set_colorkey((255,255,255))
+        # a box for every cell the stitch covers
+        for i in range(width):
+            pygame.draw.rect(glyph, (0,0,0), (int(scale * i), 0, box, box), l_weight)
+        # lines are given in cells from the top left corner of the first cell
+        for start, end in symbols.STITCH_SYMBOLS[stitch]:
+            start = (scale * start[0] + ofst, scale * start[1] + ofst)
+            end = (scale * end[0] + ofst, scale * end[1] + ofst)
+            pygame.draw.line(glyph, (0,0,0), start, end, l_weight+1)
+        return glyph
+
+    def convert(self):
+        '''
+            Converts the symbols to the display format, for faster blitting. Uses the display, so only called from the main loop.
+            Returns the atlas.
+        '''
+        if not self.converted:
+            self.glyphs = {stitch: glyph.convert() for stitch, glyph in self.glyphs.items()}
+            self.converted = True
+        return self
+
+    def get(self, stitch):
+        '''
+            Returns the surface for a stitch symbol.
+        '''
+        return self.glyphs[stitch]
+
+    def position(self, x, y) -> tuple:
+        '''
+            Returns where to blit a symbol for the cell with top left corner (x, y).
+        '''
+        return (int(x - self.ofst), int(y - self.ofst))
+
+    def layout(self, pattern, left, bottom, start=0, stop=None) -> list:
+        '''
+            Takes a pattern and returns a list of (surface, position) pairs for Surface.blits(),
+            drawing it from bottom left (row 1) to top (last row), with its bottom left corner at (left, bottom).
+            Only rows from start up to stop are laid out (default: all of them), with row start at the bottom,
+            so a large pattern or a garment can be drawn in strips.
+            note: pattern is drawn left to right but read by human right to left.
+        '''
+        scale = self.scale
+        glyphs = self.glyphs
+        blits = []
+        if stop is None:
+            stop = len(pattern)
+        for n in range(start, stop):
+            row = pattern[n]
+            y = bottom - scale * (n - start + 1)
+            x = left
+            for stitch, count in row:
+                if stitch == ' ':
+                    x += scale * count
+                else:
+                    glyph = glyphs[stitch]
+                    width = STITCH_WIDTHS[stitch]
+                    # a count of knit stitches gets a box each
+                    for no in range(count if stitch == 'k' else 1):
+                        blits.append((glyph, self.position(x, y)))
+                        x += scale * width
+        return blits
+
+    def layout_region(self, pattern, left, top, width, height) -> list:
+        '''
+            Returns a list of (surface, position) pairs for Surface.blits() that draws the part of the
+            pattern's whole chart (row 1 at the bottom) inside a region of width x height pixels,
+            whose top left corner is at (left, top) of the chart. Positions are relative to the region.
+            A symbol is always at the same place in the chart, so regions next to each other line up.
+        '''
+        scale = self.scale
+        glyphs = self.glyphs
+        rows = len(pattern)
+        margin = LINE_WEIGHT
+        #rows (counted from the top of the chart) and columns with a symbol in the region
+        first_row = max(0, int((top - margin) // scale))
+        stop_row = min(rows, int((top + height + margin) // scale) + 1)
+        first_column = max(0, int((left - margin) // scale))
+        stop_column = int((left + width + margin) // scale) + 1
+        blits = []
+        for top_row in range(first_row, stop_row):
+            y = int(scale * top_row - self.ofst) - top
+            for cell, stitch in symbols.row_cells(pattern[rows - 1 - top_row], first_column, stop_column):
+                blits.append((glyphs[stitch], (int(scale * cell - self.ofst) - left, y)))
+        return blits
+
+
+class Viewport():
+    '''
+        A zoomable, scrollable view of width x height pixels onto the chart of a pattern (a Pattern or Garment).
+        Only the part of the chart in view is drawn: the chart is split into tiles of TILE_SIZE pixels,
+        which are rendered when they first come into view and kept in a caching.TileCache for each zoom level.
+        Zoom level 0 fits the whole chart in the view (but never draws cells smaller than MIN_SCALE),
+        and every level after that is about ZOOM_STEP times larger, up to cells of MAX_SCALE.
+        x and y are where the view's top left corner is in the chart, at the current zoom level.
+        With a worker (see worker.py), missing tiles are rendered in the background and shown as placeholders
+        until they are put in the tile cache.
+    '''
+    def __init__(self, pattern, key, width, height, get_glyphs, tile_cache, worker=None):
+        self.pattern = pattern
+        self.key = key # identifies the chart in the tile cache
+        self.width = width
+        self.height = height
+        self.get_glyphs = get_glyphs # returns the GlyphAtlas for a scale, only called by whatever renders the tiles
+        self.tile_cache = tile_cache
+        self.worker = worker
+        self.missing = 0 # tiles in view that were still being rendered when it was last drawn
+        self.fit_scale = max(MIN_SCALE, min(width / pattern.width, height / pattern.height))
+        self.max_level = max(0, int(math.log(MAX_SCALE / self.fit_scale, ZOOM_STEP)))
+        self.level = 0
+        #start at the bottom right, where knitting starts
+        self.x = math.inf
+        self.y = math.inf
+        self.clamp()
+
+    @property
+    def scale(self) -> float:
+        return self.scale_at(self.level)
+
+    def scale_at(self, level) -> float:
+        '''
+            Returns the size of a chart cell at a zoom level, in pixels.
+        '''
+        #cells of a whole number of pixels all get the same line weight
+        if level == 0:
+            return self.fit_scale
+        return round(self.fit_scale * ZOOM_STEP ** level)
+
+    def level_key(self, level=None) -> tuple:
+        '''
+            Returns the key of the tiles of a zoom level (default: the current one) in the tile cache.
+        '''
+        if level is None:
+            level = self.level
+        return (self.key, self.width, self.height, level)
+
+    def chart_size(self) -> tuple:
+        '''
+            Returns the size of the whole chart at the current zoom level, in pixels.
+        '''
+        return self.pattern.width * self.scale, self.pattern.height * self.scale
+
+    def clamp(self):
+        '''
+            Keeps the view on the chart. A chart smaller than the view sits in its bottom left corner.
+        '''
+        chart_width, chart_height = self.chart_size()
+        self.x = max(0, min(self.x, int(chart_width) - self.width))
+        if chart_height <= self.height:
+            self.y = int(chart_height) - self.height
+        else:
+            self.y = max(0, min(self.y, int(chart_height) - self.height))
+
+    def zoom(self, steps, anchor=None) -> bool:
+        '''
+            Zooms in (or out, for negative steps) by a number of levels, keeping the point of the chart
+            at anchor (relative to the view, default: its centre) where it is.
+            Returns true if the view changed.
+        '''
+        level = max(0, min(self.level + steps, self.max_level))
+        if level == self.level:
+            return False
+        if anchor is None:
+            anchor = (self.width // 2, self.height // 2)
+        old_scale = self.scale
+        self.level = level
+        self.x = int((self.x + anchor[0]) * self.scale / old_scale) - anchor[0]
+        self.y = int((self.y + anchor[1]) * self.scale / old_scale) - anchor[1]
+        self.clamp()
+        return True
+
+    def pan(self, dx, dy) -> bool:
+        '''
+            Moves the view by (dx, dy) pixels. Returns true if the view changed.
+        '''
+        old = (self.x, self.y)
+        self.x += dx
+        self.y += dy
+        self.clamp()
+        return (self.x, self.y) != old
+
+    def draw(self, surface, left, top):
+        '''
+            Draws the view onto a surface with its top left corner at (left, top),
+            with room for the line weight around it.
+            Returns the rect drawn.
+        '''
+        margin = LINE_WEIGHT
+        rect = pygame.Rect(left - margin, top - margin, self.width + margin*2, self.height + margin*2)
+        clip = surface.get_clip()
+        surface.set_clip(rect)
+        surface.fill((255,255,255), rect)
+        tiles = self.tile_cache.level(self.level_key())
+        blits = []
+        self.missing = 0
+        for column, row in self.visible_tiles():
+            position = (left - margin + column * TILE_SIZE - self.x, top - margin + row * TILE_SIZE - self.y)
+            tile = tiles.find((column, row))
+            if tile is None and self.worker is not None:
+                self.request_tile(column, row)
+                surface.fill(PLACEHOLDER_COLOR, (position, (TILE_SIZE, TILE_SIZE)))
+                self.missing += 1
+                continue
+            if tile is None:
+                tile = self.render_tile(column, row)
+                tiles.put((column, row), tile)
+            blits.append((tile, position))
+        surface.blits(blits, doreturn=False)
+        surface.set_clip(clip)
+        return rect
+
+    def visible_tiles(self) -> list:
+        '''
+            Returns (column, row) of every tile in view at the current zoom level.
+        '''
+        margin = LINE_WEIGHT
+        chart_width, chart_height = self.chart_size()
+        #tiles start one line weight above and left of the chart, so the outer lines are in them
+        columns = range(max(0, self.x // TILE_SIZE), min(int(chart_width + margin*2) // TILE_SIZE, (self.x + self.width + margin*2) // TILE_SIZE) + 1)
+        rows = range(max(0, self.y // TILE_SIZE), min(int(chart_height + margin*2) // TILE_SIZE, (self.y + self.height + margin*2) // TILE_SIZE) + 1)
+        return [(column, row) for row in rows for column in columns]
+
+    def request_tile(self, column, row) -> bool:
+        '''
+            Asks the worker to render a tile at the current zoom level, unless it is already being rendered (or failed).
+            The main loop puts the result in the tile cache. Returns true if the worker took the job.
+        '''
+        return self.worker.submit(('tile', self.level_key(), (column, row)), self.render_tile_steps, column, row, self.level)
+
+    def prefetch(self) -> int:
+        '''
+            Asks the worker to render every tile in view that isn't cached yet, without drawing anything.
+            Returns the number of tiles the worker took.
+        '''
+        tiles = self.tile_cache.level(self.level_key())
+        missing = [tile for tile in self.visible_tiles() if tile not in tiles.entries]
+        return sum(self.request_tile(column, row) for column, row in missing)
+
+    @profiler.timed('render tile')
+    def render_tile(self, column, row, level=None):
+        '''
+            Draws one tile of the chart at a zoom level (default: the current one) onto a new surface,
+            converted to the display format. Only called from the main loop. Returns the surface.
+        '''
+        steps = self.render_tile_steps(column, row, level)
+        try:
+            while True:
+                next(steps)
+        except StopIteration as done:
+            return done.value.convert()
+
+    def render_tile_steps(self, column, row, level=None):
+        '''
+            Same as render_tile, as a generator that yields after every TILE_CHUNK_ROWS rows of the chart
+            and returns the surface, so a background worker can spread the work out.
+            The tile isn't converted to the display format, which SDL doesn't allow from other threads,
+            whatever runs the steps converts it on the main loop.
+        '''
+        if level is None:
+            level = self.level
+        tile = pygame.Surface((TILE_SIZE, TILE_SIZE), 0, 32)
+        tile.fill((255,255,255))
+        atlas = self.get_glyphs(self.scale_at(level))
+        scale = atlas.scale
+        left = column * TILE_SIZE - LINE_WEIGHT
+        top = row * TILE_SIZE - LINE_WEIGHT
+        #the tile is laid out a strip of rows at a time
+        strip = TILE_CHUNK_ROWS * scale
+        for y in range(0, TILE_SIZE, max(1, int(strip))):
+            height = min(int(strip), TILE_SIZE - y)
+            blits = atlas.layout_region(self.pattern, left, top + y, TILE_SIZE, height)
+            tile.blits([(glyph, (x, position_y + y)) for glyph, (x, position_y) in blits], doreturn=False)
+            yield
+        return tile
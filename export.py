@@ -0,0 +1,264 @@
+'''
+Headless batch exporter for printable pattern charts.
+
+Renders the pattern page (legend, instructions and chart, as drawn by Pattern_Scene in main.py)
+to a PNG for every combination of yarn weight, spike size and spike distance offered by the sliders.
+Charts are rendered in parallel by a pool of processes using SDL's dummy video driver,
+and charts that are already up to date are skipped.
+With --chart svg or --chart pdf, the chart is instead written as a scalable vector chart (see vector.py),
+a PDF being split into printable pages.
+
+With --garment, the pattern is instead tiled to a full garment (see knitting.Garment).
+Its instructions are written to a text file, with repeated rows summarised
+(or with --format, every row as plain text, CSV or JSON Lines, streamed to the file in batches),
+and its chart is saved in strips of rows (or as one vector chart), so the whole garment is never held in memory.
+Every garment's stitch counts are checked (see validate.py) before it is exported.
+
+Usage: python3 export.py [--out charts] [--workers 4] [--force] [--chart pdf] [--garment CAST_ON ROWS [--format text]]
+
+Dependencies: Pygame, NumPy (for --garment)
+Install: python3 -m pip install -U pygame numpy --user
+For more information: https://www.pygame.org/wiki/GettingStarted
+'''
+import argparse
+import knitting
+import multiprocessing
+import os
+import sys
+import time
+
+#files the rendered charts depend on (everything main.py loads), a chart older than any of these is rendered again
+#a folder stands for every file in it, and the asset bundle only counts when it has been built
+SOURCES = ['main.py', 'knitting.py', 'chart.py', 'symbols.py', 'vector.py', 'caching.py', 'validate.py', 'export.py',
+           'interactive.py', 'assets.py', 'scheduler.py', 'worker.py', 'prefetch.py', 'profiler.py', 'replay.py',
+           'Delius-Regular.ttf', 'Images', 'assets.bundle']
+
+GARMENT_CELL_SIZE = 12 #size of one stitch in garment charts, in pixels
+GARMENT_STRIP_ROWS = 100 #rows of a garment chart saved in each image
+#file extension of the garment instructions for each format, 'summary' summarises repeated rows
+GARMENT_EXTENSIONS = {'summary': '.txt', 'text': '.txt', 'csv': '.csv', 'jsonl': '.jsonl'}
+
+#the pattern scene used by each worker process
+_scene = None
+
+
+def chart_filename(yarn, b_height, b_dist, chart_format='png') -> str:
+    '''
+    Returns the file name for a chart, e.g. chart_8ply_size4_dist2.png
+    '''
+    yarn = yarn.replace(' ', '').replace('+', 'plus')
+    return f'chart_{yarn}_size{b_height}_dist{b_dist}.{chart_format}'
+
+
+def garment_filename(yarn, b_height, b_dist, cast_on, length) -> str:
+    '''
+    Returns the start of the file names for a garment, e.g. garment_8ply_size4_dist2_100x1000
+    '''
+    yarn = yarn.replace(' ', '').replace('+', 'plus')
+    return f'garment_{yarn}_size{b_height}_dist{b_dist}_{cast_on}x{length}'
+
+
+def newest_source_mtime() -> float:
+    '''
+    Returns the modified time of the newest file in SOURCES, leaving out the ones that don't exist.
+    '''
+    mtimes = []
+    for source in SOURCES:
+        if os.path.isdir(source):
+            mtimes += [os.path.getmtime(os.path.join(source, name)) for name in os.listdir(source)]
+        elif os.path.exists(source):
+            mtimes.append(os.path.getmtime(source))
+    return max(mtimes)
+
+
+def garment_strips(length) -> list:
+    '''
+    Returns (first row, last row) of every strip a garment chart of length rows is saved in, the last row not included.
+    '''
+    return [(first, min(first + GARMENT_STRIP_ROWS, length)) for first in range(0, length, GARMENT_STRIP_ROWS)]
+
+
+def garment_outputs(path, length, format, chart_format) -> list:
+    '''
+    Returns every file render_garment() writes for the garment whose file names start with path.
+    '''
+    outputs = [path + GARMENT_EXTENSIONS[format]]
+    if chart_format != 'png':
+        outputs.append(f'{path}.{chart_format}')
+    else:
+        outputs += [f'{path}_rows{first+1}-{last}.png' for first, last in garment_strips(length)]
+    return outputs
+
+
+def is_up_to_date(path, sources_mtime) -> bool:
+    '''
+    Returns true when the file exists and is newer than every source it depends on.
+    '''
+    return os.path.exists(path) and os.path.getmtime(path) >= sources_mtime
+
+
+def chart_title(yarn, b_height, b_dist) -> str:
+    '''
+    Returns the title written on a vector chart, e.g. 8 ply, spike size 4, spike distance 2
+    '''
+    return f'{yarn}, spike size {b_height}, spike distance {b_dist}'
+
+
+def save_vector(pattern, path, title):
+    '''
+    Writes a pattern to path as an SVG or PDF chart, depending on its extension.
+    '''
+    import vector
+    if path.endswith('.svg'):
+        with open(path, 'w') as file:
+            vector.write_svg(pattern, file, title)
+    else:
+        with open(path, 'wb') as file:
+            vector.write_pdf(pattern, file, title)
+
+
+def init_worker():
+    '''
+    Sets up pygame with the dummy video driver and a pattern scene to draw with, once per worker process.
+    '''
+    global _scene
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    import pygame
+    import main
+    pygame.init()
+    screen = pygame.display.set_mode((main.WINDOW_WIDTH, main.WINDOW_HEIGHT))
+    scene_manager = main.SceneManager('pattern', main.YARN_WEIGHTS[0], main.SPIKE_SIZES[0], main.SPIKE_DISTANCES[0])
+    _scene = main.Pattern_Scene(screen, scene_manager)
+
+
+def render_chart(job) -> tuple:
+    '''
+    Renders the pattern page for one set of settings and saves it.
+    Returns (path, seconds taken).
+    '''
+    import pygame
+    yarn, b_height, b_dist, path = job
+    start = time.perf_counter()
+    _scene.scene_manager.setPattern(yarn, b_height, b_dist)
+    if path.endswith('.png'):
+        _scene.draw_page(_scene.scene_manager.getPattern())
+        pygame.image.save(_scene.screen, path)
+    else:
+        save_vector(_scene.scene_manager.getPattern().pattern, path, chart_title(yarn, b_height, b_dist))
+    return path, time.perf_counter() - start
+
+
+def render_garment(job) -> tuple:
+    '''
+    Tiles the pattern for one set of settings to a garment, and saves its instructions
+    and its chart, in strips of GARMENT_STRIP_ROWS rows or as an SVG or PDF chart.
+    Returns (path of the instructions, seconds taken).
+    '''
+    import pygame
+    import main
+    import validate
+    yarn, b_height, b_dist, cast_on, length, format, chart_format, path = job
+    start = time.perf_counter()
+    garment = knitting.Garment(b_height, b_dist, cast_on, length)
+    #don't export a garment that can't be knitted
+    errors = validate.validate_pattern(garment)
+    if errors:
+        raise ValueError(f'{garment_filename(*job[:5])} has stitch count errors: ' + '; '.join(errors))
+
+    instructions = path + GARMENT_EXTENSIONS[format]
+    with open(instructions, 'w') as file:
+        if format == 'summary':
+            #repeated rows and blocks of rows are only written once
+            file.write(f'Yarn: {yarn}, suggested needle size: {main.YARN_TO_NEEDLESIZE[yarn]}\n')
+            file.write(f'Cast on {cast_on} stitches.\n')
+            for line in knitting.pattern_to_strarray(garment, repeat=False)[1:]:
+                file.write(line + '\n')
+            file.write('Cast off.\n')
+        else:
+            knitting.write_pattern(garment, file, format)
+
+    if chart_format != 'png':
+        save_vector(garment, f'{path}.{chart_format}', chart_title(yarn, b_height, b_dist) + f', {cast_on} x {length}')
+        return instructions, time.perf_counter() - start
+
+    #the chart is drawn one strip of rows at a time
+    atlas = _scene.scene_manager.getGlyphs(GARMENT_CELL_SIZE)
+    margin = main.CHART_MARGIN
+    for first, last in garment_strips(length):
+        strip_height = (last - first) * GARMENT_CELL_SIZE
+        surface = pygame.Surface((garment.width * GARMENT_CELL_SIZE + margin*2, strip_height + margin*2)).convert()
+        surface.fill((255,255,255))
+        surface.blits(atlas.layout(garment, margin, margin + strip_height, first, last), doreturn=False)
+        pygame.image.save(surface, f'{path}_rows{first+1}-{last}.png')
+    return instructions, time.perf_counter() - start
+
+
+def export_charts(out_dir, yarns, sizes, distances, workers=None, force=False, garment=None, format='summary', chart_format='png'):
+    '''
+    Renders charts for every combination of the given settings into out_dir,
+    as pattern pages (png) or as vector charts of the pattern (svg or pdf).
+    When garment is given as (cast on, rows), exports full garments instead,
+    with their instructions in format (one of GARMENT_EXTENSIONS).
+    Returns (charts rendered, charts skipped, seconds taken).
+    '''
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    sources_mtime = newest_source_mtime()
+
+    #only render the charts that aren't up to date
+    jobs = []
+    skipped = 0
+    for yarn in yarns:
+        for b_height in sizes:
+            for b_dist in distances:
+                if garment is None:
+                    path = os.path.join(out_dir, chart_filename(yarn, b_height, b_dist, chart_format))
+                    job = (yarn, b_height, b_dist, path)
+                    outputs = [path]
+                else:
+                    path = os.path.join(out_dir, garment_filename(yarn, b_height, b_dist, *garment))
+                    job = (yarn, b_height, b_dist, *garment, format, chart_format, path)
+                    outputs = garment_outputs(path, garment[1], format, chart_format)
+                #a garment is only up to date when every file it is saved in is
+                if not force and all(is_up_to_date(output, sources_mtime) for output in outputs):
+                    skipped += 1
+                else:
+                    jobs.append(job)
+
+    render_time = 0
+    if jobs:
+        pool = multiprocessing.Pool(workers, initializer=init_worker)
+        render = render_chart if garment is None else render_garment
+        for path, seconds in pool.imap_unordered(render, jobs):
+            render_time += seconds
+        #let the workers exit on their own, SDL catches the signal Pool.terminate() would send
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+
+    print(f'{len(jobs)} charts rendered, {skipped} up to date, in {elapsed:.2f}s')
+    if jobs:
+        print(f'{len(jobs)/elapsed:.1f} charts/s overall, {render_time/len(jobs)*1000:.1f} ms per chart per worker')
+    return len(jobs), skipped, elapsed
+
+
+if __name__ == '__main__':
+    #the exporter uses the fonts and images relative to this folder
+    invoked_from = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+    import main
+
+    parser = argparse.ArgumentParser(description='Render printable pattern charts for a grid of settings.')
+    parser.add_argument('--out', default='charts', help='folder to save the charts in')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--yarn', nargs='+', default=main.YARN_WEIGHTS, help='yarn weights to render')
+    parser.add_argument('--sizes', nargs='+', type=int, default=main.SPIKE_SIZES, help='spike sizes to render')
+    parser.add_argument('--distances', nargs='+', type=int, default=main.SPIKE_DISTANCES, help='spike distances to render')
+    parser.add_argument('--force', action='store_true', help='render charts even if they are up to date')
+    parser.add_argument('--garment', nargs=2, type=int, metavar=('CAST_ON', 'ROWS'), help='export full garments of this size instead')
+    parser.add_argument('--chart', choices=['png', 'svg', 'pdf'], default='png', help='format of the charts (default: png)')
+    parser.add_argument('--format', choices=GARMENT_EXTENSIONS, default='summary', help='format of the garment instructions (default: summary)')
+    args = parser.parse_args()
+    export_charts(os.path.join(invoked_from, args.out), args.yarn, args.sizes, args.distances, args.workers, args.force, args.garment, args.format, args.chart)
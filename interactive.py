@@ -1,17 +1,148 @@
 '''
-This file contains functions to create buttons and sliders with images that change on hover.
+This file contains functions to create buttons and sliders with images that change on hover,
+and the input manager that passes the mouse to them.
+
+Widgets don't look at the mouse themselves: each scene has an InputManager that takes the frame's events,
+keeps one snapshot of the mouse, and tells only the widgets whose state changes (hovered, pressed, dragged
+or released). It finds the widget under the mouse through a grid of widget areas, so handling the mouse
+doesn't get slower as more widgets are added.
+
+Widgets can be drawn in dirty-rect mode: when a widget has a background surface,
+it is only drawn again when its state changes. It then restores the background behind itself first
+and stores the regions of the screen it changed, to be collected with get_dirty_rects().
 
 Dependencies: Pygame 
 Install: python3 -m pip install -U pygame --user
 For more information: https://www.pygame.org/wiki/GettingStarted
 '''
 import pygame
-import math
+import profiler
+
+GRID_SIZE = 100 #size of the cells of the grid widgets are found in, in pixels
+
+
+class InputManager():
+    '''
+        Keeps a snapshot of the mouse (pos, pressed), updated from the events passed to handle_event(),
+        and hands the mouse to the widgets added to it.
+        A widget has a hit_rect (the area it can be hit in, kept in a grid of GRID_SIZE cells),
+        hit(pos) to check a point in that area, and set_hover(hover), press(pos), drag(pos) and release(pos),
+        which are only called when that widget's state changes.
+        A pressed widget captures the mouse, so it is dragged and released even when the mouse leaves it.
+    '''
+    def __init__(self, grid_size=GRID_SIZE):
+        self.grid_size = grid_size
+        self.grid = {} # (column, row): widgets whose hit rect overlaps that cell
+        self.rects = {} # widget: hit rect it is stored in the grid under
+        self.pos = pygame.mouse.get_pos()
+        self.pressed = False # left mouse button is held
+        self.hovered = None # widget under the mouse
+        self.captured = None # widget that was pressed, until the button is released
+
+    def cells(self, rect):
+        g = self.grid_size
+        for column in range(rect.left // g, (rect.right - 1) // g + 1):
+            for row in range(rect.top // g, (rect.bottom - 1) // g + 1):
+                yield (column, row)
+
+    def add(self, widget):
+        '''
+            Adds a widget, shown hovered straight away if the mouse is over it.
+        '''
+        rect = pygame.Rect(widget.hit_rect)
+        self.rects[widget] = rect
+        for cell in self.cells(rect):
+            self.grid.setdefault(cell, []).append(widget)
+        self.hover_at(self.pos)
+
+    def remove(self, widget):
+        for cell in self.cells(self.rects.pop(widget)):
+            self.grid[cell].remove(widget)
+        if self.hovered is widget:
+            self.hovered = None
+        if self.captured is widget:
+            self.captured = None
+
+    def moved(self, widget):
+        '''
+            Stores a widget under its hit rect again if it changed (e.g. a slider that moved).
+        '''
+        if self.rects[widget] != widget.hit_rect:
+            captured = self.captured
+            self.remove(widget)
+            self.add(widget)
+            self.captured = captured
+
+    def widget_at(self, pos):
+        '''
+            Returns the widget at a point, or None.
+        '''
+        cell = (pos[0] // self.grid_size, pos[1] // self.grid_size)
+        for widget in self.grid.get(cell, ()):
+            if self.rects[widget].collidepoint(pos) and widget.hit(pos):
+                return widget
+        return None
+
+    def hover_at(self, pos):
+        #tells the widgets the mouse moved off and onto, if it did
+        widget = None if pos is None else self.widget_at(pos)
+        if widget is not self.hovered:
+            if self.hovered is not None:
+                self.hovered.set_hover(False)
+            if widget is not None:
+                widget.set_hover(True)
+            self.hovered = widget
+
+    def reset(self):
+        '''
+            Reads the mouse again, for when the scene is shown after other scenes had its events.
+        '''
+        self.pos = pygame.mouse.get_pos()
+        self.pressed = pygame.mouse.get_pressed()[0] == 1
+        self.captured = None
+        self.hover_at(self.pos)
+
+    def handle_event(self, event) -> bool:
+        '''
+            Updates the snapshot of the mouse from an event, and passes it to the widgets it concerns.
+            Returns true when the event was used by a widget.
+        '''
+        if event.type == pygame.MOUSEMOTION:
+            self.pos = event.pos
+            if self.captured is not None:
+                self.captured.drag(event.pos)
+                self.moved(self.captured)
+            self.hover_at(event.pos)
+            return self.captured is not None
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self.pos = event.pos
+            self.pressed = True
+            widget = self.widget_at(event.pos)
+            if widget is not None:
+                widget.press(event.pos)
+                self.moved(widget)
+                self.captured = widget
+            return widget is not None
+        if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self.pos = event.pos
+            self.pressed = False
+            widget = self.captured
+            self.captured = None
+            if widget is not None:
+                widget.release(event.pos)
+                self.moved(widget)
+            self.hover_at(event.pos)
+            return widget is not None
+        if event.type == pygame.WINDOWLEAVE:
+            self.hover_at(None)
+        return False
+
 
 class Button():
     '''
         Class for interactive button. 
         When drawn, returns true when clicked.
+        Gets the mouse from an InputManager.
 
         To make this class I started by following a button tutorial by Rustam (Coding with Russ)
         but extended from that with the addition of a hoverstate
@@ -29,38 +160,76 @@ class Button():
         h = img.get_height()
         self.area = pygame.Rect(x, y, w, h) #setting collision area
         self.hover = False
-        self.previouslypressed = False
+        self.clicked = False # pressed since last drawn
+        #dirty-rect mode settings
+        self.background = None #surface to restore behind the button, None to always draw
+        self.draw_area = self.area.union(hover_img.get_rect(topleft=(x, y))) #area covered by either image
+        self.drawn_hover = None #hoverstate when last drawn
+        self.dirty_rects = []
+
+    def redraw(self):
+        '''
+            Makes the button draw itself next frame, even if its state hasn't changed.
+        '''
+        self.drawn_hover = None
+
+    def get_dirty_rects(self) -> list:
+        '''
+            Returns the regions changed since this was last called (dirty-rect mode).
+        '''
+        rects = self.dirty_rects
+        self.dirty_rects = []
+        return rects
     
+    @property
+    def hit_rect(self):
+        return self.area
+
+    def hit(self, pos) -> bool:
+        return True
+
+    def set_hover(self, hover):
+        self.hover = hover
+
+    def press(self, pos):
+        # only a click that starts on the button counts,
+        # not the mouse being dragged over it while being held.
+        self.clicked = True
+
+    def drag(self, pos):
+        pass
+
+    def release(self, pos):
+        pass
+
+    @profiler.timed('Button.draw')
     def draw(self) -> bool:
         '''
             Draws button.
-            Returns true when button is pressed.
+            Returns true when button was pressed since it was last drawn.
         '''
-        pressed = False
-        clicked = False
-
         #if mouse is over the button, display the hover image.
-        if self.area.collidepoint(pygame.mouse.get_pos()):
-            self.screen.blit(self.hover_img, (self.x, self.y))
-            if pygame.mouse.get_pressed()[0] == 1:
-                pressed = True
-        else:
-            self.screen.blit(self.img, (self.x, self.y))
-        
-        # distinguishes between whether the mouse was dragged over while being held,
-        # or if the user clicked on this button intentionally.
-        if pressed and not self.previouslypressed:
-            clicked = True
-        if pygame.mouse.get_pressed()[0] == 1:
-            self.previouslypressed = True
-        else:
-            self.previouslypressed = False
+        #in dirty-rect mode, only draw when the hoverstate changed.
+        if self.background is None or self.hover != self.drawn_hover:
+            if self.background is not None:
+                self.screen.blit(self.background, self.draw_area, self.draw_area)
+                self.dirty_rects.append(self.draw_area)
+            if self.hover:
+                self.screen.blit(self.hover_img, (self.x, self.y))
+            else:
+                self.screen.blit(self.img, (self.x, self.y))
+            self.drawn_hover = self.hover
+
+        clicked = self.clicked
+        self.clicked = False
         return clicked
     
 class Slider():
     '''
     Class for interactive slider that allows user to select from an ordered range of values. 
-    When drawn, returns true when clicked.
+    When drawn, returns its value.
+    Gets the mouse from an InputManager: the slider button is dragged along the bar,
+    and snaps to the nearest value when let go of.
     '''
     def __init__(self, screen, scene_manager, label, x, y, slider_img, hover_img, bar_img, values):
         self.screen = screen 
@@ -86,63 +255,112 @@ class Slider():
         for n in range(len(values)):
             steps.append(x + n*( self.len/ (len(values)-1)))
         self.steps = steps
-        # uses previous mouse position instead of current mouse position 
-        # so you feel like you're dragging something
-        self.pMouseX = 0
 
-        self.clicked = False
+        self.clicked = False # the slider button is being dragged
+        self.hover = False
+
+        #dirty-rect mode settings
+        self.background = None #surface to restore behind the slider, None to always draw
+        self.drawn_state = None #slider position, image and value when last drawn
+        self.drawn_rect = None #area covered when last drawn
+        self.dirty_rects = []
+
+    def redraw(self):
+        '''
+            Makes the slider draw itself next frame, even if its state hasn't changed.
+        '''
+        self.drawn_state = None
+        self.drawn_rect = None
+
+    def get_dirty_rects(self) -> list:
+        '''
+            Returns the regions changed since this was last called (dirty-rect mode).
+        '''
+        rects = self.dirty_rects
+        self.dirty_rects = []
+        return rects
+
+    @property
+    def hit_rect(self):
+        #the square around the round slider button
+        return pygame.Rect(self.slider_posX - self.slider_size, self.slider_posY, self.slider_size*2, self.slider_size*2)
+
+    def hit(self, pos) -> bool:
+        #the mouse is on the slider button when it is closer to its centre than its radius
+        dx = pos[0] - self.slider_posX
+        dy = pos[1] - self.slider_posY - self.slider_size
+        return dx*dx + dy*dy < self.slider_size*self.slider_size
+
+    def set_hover(self, hover):
+        self.hover = hover
 
+    def press(self, pos):
+        self.clicked = True
+        self.drag(pos)
 
+    def drag(self, pos):
+        '''
+            Makes the slider follow the mouse x position while it is held.
+        '''
+        self.slider_posX = pos[0]
+        # stop the slider when it reaches either end of the bar
+        if self.slider_posX > self.x + self.len:
+            self.slider_posX = self.x + self.len
+        if self.slider_posX < self.x :
+            self.slider_posX = self.x
+
+    def release(self, pos):
+        '''
+            Snaps the slider to the nearest value upon letting go of the mouse.
+        '''
+        self.clicked = False
+        smallest_diff = abs(self.slider_posX-self.steps[0])
+        index_closest = 0
+        for n in range(len(self.steps)):
+            if abs(self.slider_posX - self.steps[n]) < smallest_diff:
+                index_closest = n
+                smallest_diff = abs(self.slider_posX - self.steps[n])
+        self.slider_posX = self.steps[index_closest]
+        self.value = self.values[index_closest]
+
+    @profiler.timed('Slider.draw')
     def draw(self):
         '''
-            Draws slider, snaps slider to nearest value
+            Draws slider.
             Return current value of slider.
         '''
-        # draw the bar 
-        self.screen.blit(self.bar_img, (self.x, self.y))
-        # label the bottom value, the top value and the current value
-        top = self.values[-1]
-        bottom = self.values[0]
-        bottom_label = self.scene_manager.h2.render(f'{bottom}', True, (0,0,0))
-        self.screen.blit(bottom_label, (self.x-bottom_label.get_size()[0]/2, self.y+self.slider_size+15))
-        top_label = self.scene_manager.h2.render(f'{top}', True, (0,0,0))
-        self.screen.blit(top_label, (self.x+self.len-bottom_label.get_size()[0]/2, self.y+self.slider_size+15))
-        value_label = self.scene_manager.h1.render(f'{self.label}{self.value}', True, (0,0,0))
-        self.screen.blit(value_label, (self.x+self.len/2-value_label.get_size()[0]/2, self.y-self.slider_size-15))
-
-        #calculate the distance of the mouse from the slider, to be used later
-        mouse_pos = pygame.mouse.get_pos()
-        dist_mouse = math.sqrt((mouse_pos[0] - self.slider_posX)**2 + (mouse_pos[1] - self.slider_posY-self.slider_size)**2)
-
-        #if the slider was previously clicked, make the slider follow the mouse x position
-        if self.clicked:
-            self.slider_posX = mouse_pos[0]
-            # stop the slider when it reaches either end of the bar
-            if self.slider_posX > self.x + self.len:
-                self.slider_posX = self.x + self.len
-            if self.slider_posX < self.x :
-                self.slider_posX = self.x
-            # draw the hover image 
-            self.screen.blit(self.hover_img, (self.slider_posX-self.slider_size, self.slider_posY))
-            #upon letting go of the mouse, snap the slider to the nearest value
-            if pygame.mouse.get_pressed()[0] != 1:
-                self.clicked = False
-                smallest_diff = abs(self.slider_posX-self.steps[0])
-                index_closest = 0
-                for n in range(len(self.steps)):
-                    if abs(self.slider_posX - self.steps[n]) < smallest_diff:
-                        index_closest = n
-                        smallest_diff = abs(self.slider_posX - self.steps[n])
-                self.slider_posX = self.steps[index_closest]
-                self.value = self.values[index_closest]
-        # if the slider hasn't been clicked but the mouse is hovering, draws the hover img and accept any clicks
-        elif dist_mouse < self.slider_size:
-            self.screen.blit(self.hover_img, (self.slider_posX-self.slider_size, self.slider_posY))
-            if pygame.mouse.get_pressed()[0] == 1:
-                self.clicked = True       
-        #else draw the initial image.
+        # uses the hover image while the slider is hovered over or dragged, else the initial image.
+        if self.clicked or self.hover:
+            img = self.hover_img
         else:
-            self.screen.blit(self.slider_img, (self.slider_posX-self.slider_size, self.slider_posY))
-        self.pMouseX = mouse_pos[0] #set value of previous frame's mouse position, so the slider trails behind mouse
+            img = self.slider_img
+
+        #in dirty-rect mode, only draw when the slider moved, changed image or changed value
+        state = (self.slider_posX, img, self.value)
+        if self.background is None or state != self.drawn_state:
+            if self.background is not None and self.drawn_rect is not None:
+                self.screen.blit(self.background, self.drawn_rect, self.drawn_rect)
+            # draw the bar 
+            rects = [self.screen.blit(self.bar_img, (self.x, self.y))]
+            # label the bottom value, the top value and the current value
+            top = self.values[-1]
+            bottom = self.values[0]
+            bottom_label = self.scene_manager.text_cache.render(self.scene_manager.h2, f'{bottom}', True, (0,0,0))
+            rects.append(self.screen.blit(bottom_label, (self.x-bottom_label.get_size()[0]/2, self.y+self.slider_size+15)))
+            top_label = self.scene_manager.text_cache.render(self.scene_manager.h2, f'{top}', True, (0,0,0))
+            rects.append(self.screen.blit(top_label, (self.x+self.len-bottom_label.get_size()[0]/2, self.y+self.slider_size+15)))
+            value_label = self.scene_manager.text_cache.render(self.scene_manager.h1, f'{self.label}{self.value}', True, (0,0,0))
+            rects.append(self.screen.blit(value_label, (self.x+self.len/2-value_label.get_size()[0]/2, self.y-self.slider_size-15)))
+            # draw the slider button
+            rects.append(self.screen.blit(img, (self.slider_posX-self.slider_size, self.slider_posY)))
+            #the changed region covers where the slider was drawn before and where it is now
+            rect = rects[0].unionall(rects[1:])
+            if self.background is not None:
+                if self.drawn_rect is not None:
+                    self.dirty_rects.append(rect.union(self.drawn_rect))
+                else:
+                    self.dirty_rects.append(rect)
+            self.drawn_rect = rect
+            self.drawn_state = state
 
         return self.value 
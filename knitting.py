@@ -2,12 +2,110 @@
 This file contains functions to generate a knitting pattern based on specific heights and distances,
 plus functions to convert the generated pattern to human-readable strings.
 
+A pattern is a list of rows, and each row is a list of (stitch, count) pairs.
+Generated patterns are stored compactly as a Pattern, which can be used the same way.
+The write_* functions stream a pattern's instructions to a file as plain text, CSV or JSON Lines.
 '''
+from array import array
+import json
 
+#every stitch a pattern can use (' ' is an empty space in the chart), in the order they are stored in a Pattern
+STITCHES = [' ', 'k', 'kyok', 'sk2p']
+STITCH_CODES = {stitch: code for code, stitch in enumerate(STITCHES)}
+#how many chart cells each stitch covers
+STITCH_WIDTHS = {' ': 1, 'k': 1, 'kyok': 1, 'sk2p': 3}
 
-def generate_pattern(b_height: int, b_dist: int) -> list:
+
+class Pattern():
+    '''
+        Compact storage for a knitting pattern.
+        Rows are stored run-length encoded in flat typed arrays:
+        a stitch code and a count for every run, and where each row starts.
+        Can be used like the list of rows of (stitch, count) pairs it replaces,
+        e.g. len(pattern), pattern[n], or looping over the rows.
+    '''
+    def __init__(self, rows=()):
+        self.codes = array('B') # index of the stitch in STITCHES for every run
+        self.counts = array('I') # number of stitches in every run
+        self.row_starts = array('I', [0]) # index of the first run of every row, plus the end of the last row
+        self.width = 0 # width of the widest row in chart cells
+        for row in rows:
+            self.add_row(row)
+
+    def add_row(self, row):
+        '''
+            Adds a row, given as a list of (stitch, count) pairs, to the top of the pattern.
+        '''
+        width = 0
+        for stitch, count in row:
+            self.codes.append(STITCH_CODES[stitch])
+            self.counts.append(count)
+            width += count * STITCH_WIDTHS[stitch]
+        self.row_starts.append(len(self.codes))
+        if width > self.width:
+            self.width = width
+
+    @property
+    def height(self) -> int:
+        return len(self.row_starts) - 1
+
+    def row(self, n) -> list:
+        '''
+            Returns row n as a list of (stitch, count) pairs.
+        '''
+        start = self.row_starts[n]
+        end = self.row_starts[n+1]
+        return [(STITCHES[code], count) for code, count in zip(self.codes[start:end], self.counts[start:end])]
+
+    def rows(self):
+        '''
+            Yields every row from the bottom (row 1) to the top, as lists of (stitch, count) pairs.
+        '''
+        codes = self.codes
+        counts = self.counts
+        starts = self.row_starts
+        for n in range(len(starts) - 1):
+            yield [(STITCHES[codes[i]], counts[i]) for i in range(starts[n], starts[n+1])]
+
+    def to_list(self) -> list:
+        '''
+            Returns the pattern as a list of rows of (stitch, count) pairs.
+        '''
+        return list(self.rows())
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, n):
+        if n < 0:
+            n += self.height
+        if n < 0 or n >= self.height:
+            raise IndexError('pattern row out of range')
+        return self.row(n)
+
+    def __iter__(self):
+        return self.rows()
+
+    def __eq__(self, other):
+        if isinstance(other, Pattern):
+            return self.codes == other.codes and self.counts == other.counts and self.row_starts == other.row_starts
+        return self.to_list() == list(other)
+
+
+def as_pattern(pattern) -> Pattern:
+    '''
+    Returns pattern as a Pattern, converting it if it is a list of rows.
+    Garments are returned as they are, so their rows are still made one at a time.
+    '''
+    if isinstance(pattern, (Pattern, Garment)):
+        return pattern
+    return Pattern(pattern)
+
+
+
+def generate_pattern(b_height: int, b_dist: int) -> Pattern:
     '''
-    Returns a list representing a knitting pattern for given bumpiness params
+    Returns a Pattern representing a knitting pattern for given bumpiness params
     '''
     pattern = []
     for n in range(2):
@@ -38,80 +136,455 @@ def generate_pattern(b_height: int, b_dist: int) -> list:
         row.append(('kyok', 1))
         row.append(('k', n+b_dist))
         pattern.append(row)
-    return pattern
+    return Pattern(pattern)
 
-def pattern_to_string(pattern: list) -> str:
+class PatternBatch():
     '''
-    Converts a list as generated by generate_pattern() to a string that can be easily read by humans.
-    This function exists to check that pattern generation wasre working and isn't used for anything else
-    Returns a string (instructions).
+        Many patterns stored together in columns, as made by generate_patterns().
+        codes, counts and row_starts are the same as in a Pattern but for every pattern one after the other,
+        pattern_starts is the first row of every pattern (plus the end of the last one),
+        and heights and distances are the settings of every pattern. All of them are numpy arrays.
+        widths is the width of every pattern in chart cells, worked out from the runs like a Pattern's.
+    '''
+    def __init__(self, codes, counts, row_starts, pattern_starts, heights, distances):
+        import numpy as np
+        self.codes = codes
+        self.counts = counts
+        self.row_starts = row_starts
+        self.pattern_starts = pattern_starts
+        self.heights = heights
+        self.distances = distances
+        #the width of every row, then the widest row of every pattern (every row has at least one run)
+        self.widths = np.zeros(len(heights), dtype=np.int64)
+        if len(codes):
+            run_widths = np.array([STITCH_WIDTHS[stitch] for stitch in STITCHES])[codes] * counts
+            row_widths = np.add.reduceat(run_widths, row_starts[:-1])
+            self.widths = np.maximum.reduceat(row_widths, pattern_starts[:-1])
+
+    def __len__(self):
+        return len(self.heights)
+
+    def pattern(self, i) -> Pattern:
+        '''
+            Returns pattern i of the batch as a Pattern.
+        '''
+        first_row = self.pattern_starts[i]
+        last_row = self.pattern_starts[i+1]
+        first_run = self.row_starts[first_row]
+        last_run = self.row_starts[last_row]
+        pattern = Pattern()
+        pattern.codes = array('B', self.codes[first_run:last_run].tobytes())
+        pattern.counts = array('I', self.counts[first_run:last_run].astype('uint32').tobytes())
+        pattern.row_starts = array('I', (self.row_starts[first_row:last_row+1] - first_run).astype('uint32').tobytes())
+        pattern.width = int(self.widths[i])
+        return pattern
+
+    def patterns(self):
+        '''
+            Yields every pattern of the batch as a Pattern.
+        '''
+        for i in range(len(self)):
+            yield self.pattern(i)
+
+    def row_texts(self) -> list:
+        '''
+            Returns the instructions for every row of the batch, as made by row_instruction(),
+            straight from the run arrays: every different run is only written out once.
+        '''
+        import numpy as np
+        #a run is identified by its stitch code and count together
+        keys = self.counts.astype(np.int64) * len(STITCHES) + self.codes
+        runs, run_ids = np.unique(keys, return_inverse=True)
+        run_texts = [row_instruction([(STITCHES[key % len(STITCHES)], key // len(STITCHES))]) for key in runs.tolist()]
+        #rows are read from right to left, so join the runs of the reversed batch
+        texts = [run_texts[i] for i in run_ids.ravel()[::-1].tolist()]
+        end = len(texts)
+        starts = self.row_starts.tolist()
+        return [''.join(texts[end-starts[n+1]:end-starts[n]]) for n in range(len(starts) - 1)]
+
+    def to_strarrays(self, repeat: bool = True) -> list:
+        '''
+            Returns the instructions for every pattern, as made by pattern_to_strarray().
+        '''
+        texts = self.row_texts()
+        starts = self.pattern_starts.tolist()
+        return [segments_to_strarray(*compress_texts(texts[starts[i]:starts[i+1]]), repeat) for i in range(len(self))]
+
+def generate_patterns(heights, distances) -> PatternBatch:
+    '''
+    Generates the patterns for arrays of bumpiness params all at once, with numpy arithmetic.
+    heights and distances are paired up (and broadcast against each other), so for every combination use e.g.
+    generate_patterns(*numpy.meshgrid(heights, distances)).
+    Pattern i of the result is the same as generate_pattern(heights[i], distances[i]).
+    Needs numpy.
+    '''
+    import numpy as np
+    heights, distances = np.broadcast_arrays(np.asarray(heights, dtype=np.int64), np.asarray(distances, dtype=np.int64))
+    heights = heights.ravel()
+    distances = distances.ravel()
+
+    #every pattern has 2 rows of knit, h rows of spikes one way, 2 rows of knit and h rows of spikes the other way
+    rows_per_pattern = heights*2 + 4
+    pattern_starts = np.concatenate(([0], np.cumsum(rows_per_pattern)))
+    pattern_of_row = np.repeat(np.arange(len(heights)), rows_per_pattern)
+    r = np.arange(pattern_starts[-1]) - pattern_starts[pattern_of_row] # row within its pattern
+    h = heights[pattern_of_row]
+    d = distances[pattern_of_row]
+    section = np.select([r < 2, r < h + 2, r < h + 4], [0, 1, 2], 3)
+    n = np.select([section == 1, section == 3], [r - 2, r - h - 4], 0) # row within its section
+
+    #runs in every row, the first spike row has no knit stitches before its kyok
+    runs_per_row = np.choose(section, [2, 6, 1, 6])
+    runs_per_row[(section == 1) & (n == 0)] = 5
+    row_starts = np.concatenate(([0], np.cumsum(runs_per_row)))
+
+    #fill in the runs of all the rows of one section at a time:
+    #a table with the stitches of every row side by side, written to where each row's runs start
+    space, knit, kyok, sk2p = (STITCH_CODES[stitch] for stitch in (' ', 'k', 'kyok', 'sk2p'))
+    codes = np.empty(row_starts[-1], dtype=np.uint8)
+    counts = np.empty(row_starts[-1], dtype=np.int64)
+    for sec in range(4):
+        rows = np.nonzero(section == sec)[0]
+        sh = h[rows]
+        sd = d[rows]
+        sn = n[rows]
+        ones = np.ones(len(rows), dtype=np.int64)
+        if sec == 0:
+            section_codes = [space, knit]
+            options = [sh, sd*2 + sh*2 + 2]
+        elif sec == 1:
+            section_codes = [space, knit, kyok, knit, sk2p, knit]
+            options = [sh - sn, sn, ones, sh - 1 + sd, ones, sh - 1 + sd - sn]
+        elif sec == 2:
+            section_codes = [knit]
+            options = [sd*2 + sh*2 + 2]
+        else:
+            section_codes = [space, knit, sk2p, knit, kyok, knit]
+            options = [sn, sh - 1 - sn, ones, sh - 1 + sd, ones, sn + sd]
+        table = np.stack(options, axis=1)
+        keep = np.ones(table.shape, dtype=bool)
+        if sec == 1:
+            keep[:, 1] = sn > 0
+        where = row_starts[rows][:, None] + np.cumsum(keep, axis=1) - 1
+        counts[where[keep]] = table[keep]
+        codes[where[keep]] = np.broadcast_to(np.array(section_codes, dtype=np.uint8), table.shape)[keep]
+    return PatternBatch(codes, counts, row_starts, pattern_starts, heights, distances)
+
+class Garment():
+    '''
+        A pattern from generate_pattern() tiled across a cast-on width and repeated up to a length,
+        with edge stitches knitted on both sides.
+        Rows are made when they are asked for, so the whole garment is never stored:
+        only one tiled copy of each row of the pattern is kept, and row n is found directly from n.
+        Can be used like a Pattern, e.g. len(garment), garment[n], or looping over the rows.
+    '''
+    def __init__(self, b_height: int, b_dist: int, cast_on: int, length: int, edge: int = 2):
+        self.motif = generate_pattern(b_height, b_dist)
+        self.cast_on = cast_on # number of stitches across the garment
+        self.length = length # number of rows in the garment
+
+        #every row of the pattern covers the same number of stitches, not counting the empty space
+        repeat_width = 0
+        for stitch, count in self.motif.row(0):
+            if stitch != ' ':
+                repeat_width += count * STITCH_WIDTHS[stitch]
+        self.repeats = (cast_on - 2*edge) // repeat_width
+        if self.repeats < 1:
+            raise ValueError(f'cast on of {cast_on} stitches is too narrow for a {repeat_width} stitch repeat plus edges')
+        #stitches left over after the repeats are added to the edges
+        extra = cast_on - 2*edge - self.repeats*repeat_width
+        left_edge = edge + extra // 2
+        right_edge = edge + extra - extra // 2
+
+        #tile every row of the pattern across the garment once
+        self.band = Pattern()
+        for motif_row in self.motif.rows():
+            row = []
+            stitches = [(stitch, count) for stitch, count in motif_row if stitch != ' ']
+            if motif_row[0][0] == ' ' and motif_row[0][1] > 0:
+                row.append(motif_row[0])
+            for stitch, count in [('k', left_edge)] + stitches * self.repeats + [('k', right_edge)]:
+                #join knit stitches next to each other, and leave out empty ones
+                if count == 0:
+                    continue
+                if stitch == 'k' and row and row[-1][0] == 'k':
+                    row[-1] = ('k', row[-1][1] + count)
+                else:
+                    row.append((stitch, count))
+            self.band.add_row(row)
+        self.width = self.band.width
+
+    @property
+    def height(self) -> int:
+        return self.length
+
+    def row(self, n) -> list:
+        '''
+            Returns row n as a list of (stitch, count) pairs.
+        '''
+        return self.band.row(n % self.band.height)
+
+    def rows(self, start=0, stop=None):
+        '''
+            Yields the rows from start up to stop (default: the last row), one at a time.
+        '''
+        if stop is None:
+            stop = self.length
+        band_height = self.band.height
+        for n in range(start, stop):
+            yield self.band.row(n % band_height)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, n):
+        if n < 0:
+            n += self.length
+        if n < 0 or n >= self.length:
+            raise IndexError('garment row out of range')
+        return self.row(n)
+
+    def __iter__(self):
+        return self.rows()
+
+def iter_instructions(pattern):
     '''
-    pattern_string = ''
-    for n in range(len(pattern)):
-        pattern_string += f'Row {n+1}: '
-        for i in range(len(pattern[n])):
-            #check stitch type and add instructions to the return string
-            stitch = pattern[n][i][0]
+    Yields the instructions for a pattern (a Pattern, Garment or list of rows) one row at a time,
+    e.g. 'Row 3: kyok, k2, sk2p, k2, '. Garment rows are only made as they are needed.
+    '''
+    for n, row in enumerate(as_pattern(pattern).rows()):
+        line = f'Row {n+1}: '
+        for stitch, num in row:
+            #check stitch type and add instructions to the line
             if stitch == 'kyok' or stitch == 'sk2p':
-                pattern_string += f'{stitch}, '
+                line += f'{stitch}, '
             elif stitch == 'k':
-                num = pattern[n][i][1]
-                pattern_string += f'{stitch}{num}, '
-        pattern_string += '\n'
+                line += f'{stitch}{num}, '
+        yield line
+
+def pattern_to_string(pattern) -> str:
+    '''
+    Converts a pattern as generated by generate_pattern() (or a list of rows) to a string that can be easily read by humans.
+    This function exists to check that pattern generation wasre working and isn't used for anything else
+    Returns a string (instructions).
+    '''
+    pattern_string = ''.join(line + '\n' for line in iter_instructions(pattern))
     pattern_string +='Repeat from Row 1'
     return pattern_string
 
-def pattern_to_strarray(pattern: list) -> list:
+def row_instruction(row) -> str:
     '''
-        Converts a list as generated by generate_pattern() to a list where
-        every item in the list is instructions for one row of the knitting pattern
+    Returns the human-readable instructions for one row, read from right to left
+    the way it is knitted, e.g. 'k2, sk2p, k2, kyok, '
+    '''
+    parts = []
+    for stitch, num in reversed(row):
+        if stitch == 'kyok' or stitch == 'sk2p':
+            parts.append(f'{stitch}, ')
+        elif stitch == 'k':
+            parts.append(f'{stitch}{num}, ')
+    return ''.join(parts)
+
+#largest number of earlier matches checked when looking for a repeated block of rows
+REPEAT_CANDIDATES = 4
+#numbers used to hash blocks of rows
+HASH_BASE = 1000003
+HASH_MOD = (1 << 61) - 1
+
+def compress_rows(pattern) -> tuple:
+    '''
+    Finds repeated rows and repeated blocks of rows in a pattern (a Pattern, Garment or list of rows) in linear time.
+    A Garment's rows are only formatted once for its band, as in format_rows(). Returns the same as compress_texts().
+    '''
+    return compress_texts(format_rows(pattern, row_instruction))
+
+def compress_texts(row_texts) -> tuple:
+    '''
+    Finds repeated rows and repeated blocks of rows, given the instructions of every row, in linear time.
+    Every row is hashed by its instructions, rows in a row that are the same become runs,
+    and a block of runs that is repeated straight after itself becomes a repeat.
+    Returns (texts, segments) where texts is the instructions for every different row and
+    segments is a list of ('rows', first row, count, index in texts)
+    and ('repeat', first row, last row, times repeated after the first) tuples. Rows are numbered from 0.
+    '''
+    #give every different row an id, by its instructions
+    texts = []
+    text_ids = {}
+    runs = [] # (row id, first row, count) for every run of rows that are the same
+    for n, text in enumerate(row_texts):
+        row_id = text_ids.get(text)
+        if row_id is None:
+            row_id = len(texts)
+            text_ids[text] = row_id
+            texts.append(text)
+        if runs and runs[-1][0] == row_id:
+            runs[-1][2] += 1
+        else:
+            runs.append([row_id, n, 1])
+
+    #give every different run an id, and hash every prefix of the runs, so any two blocks can be compared at once
+    run_ids = {}
+    keys = [run_ids.setdefault((row_id, count), len(run_ids)) for row_id, first, count in runs]
+    size = len(keys)
+    prefix = [0] * (size + 1)
+    power = [1] * (size + 1)
+    for i in range(size):
+        prefix[i+1] = (prefix[i] * HASH_BASE + keys[i] + 1) % HASH_MOD
+        power[i+1] = power[i] * HASH_BASE % HASH_MOD
+    def block_hash(start, length):
+        return (prefix[start+length] - prefix[start] * power[length]) % HASH_MOD
+
+    #the next run that is the same as each run, to find where a repeat could start again
+    next_same = [-1] * size
+    last_seen = {}
+    for i in range(size - 1, -1, -1):
+        next_same[i] = last_seen.get(keys[i], -1)
+        last_seen[keys[i]] = i
+
+    segments = []
+    i = 0
+    while i < size:
+        #try the next few places this run appears again as the length of a repeated block
+        length = 0
+        times = 0
+        j = next_same[i]
+        tries = 0
+        while j != -1 and tries < REPEAT_CANDIDATES and i + 2*(j - i) <= size:
+            block = j - i
+            first_hash = block_hash(i, block)
+            if block_hash(j, block) == first_hash and keys[i:j] == keys[j:j+block]:
+                length = block
+                times = 1
+                while (i + (times+2)*block <= size and block_hash(i + (times+1)*block, block) == first_hash
+                       and keys[i:j] == keys[i + (times+1)*block:i + (times+2)*block]):
+                    times += 1
+                break
+            j = next_same[j]
+            tries += 1
+        if times == 0:
+            row_id, first, count = runs[i]
+            segments.append(('rows', first, count, row_id))
+            i += 1
+        else:
+            #write out the block once, then how many more times it is repeated
+            for row_id, first, count in runs[i:i+length]:
+                segments.append(('rows', first, count, row_id))
+            last_run = runs[i+length-1]
+            segments.append(('repeat', runs[i][1], last_run[1] + last_run[2] - 1, times))
+            i += length * (times + 1)
+    return texts, segments
+
+def pattern_to_strarray(pattern, repeat: bool = True) -> list:
+    '''
+        Converts a pattern as generated by generate_pattern() (or a Garment, or a list of rows) to a list where
+        every item in the list is instructions for one row of the knitting pattern.
+        Rows that are the same in a row are summarised (e.g. 'Rows 1-2: k8, ') and blocks of rows
+        that repeat are only written once (e.g. 'Repeat rows 1-12 4 more times (up to row 60)').
+        When repeat is true, the instructions end by saying to repeat from row 1.
         Returns list of strings (row by row instructions)
     '''
-    pattern_strarray = ['Instructions:']
+    return segments_to_strarray(*compress_rows(pattern), repeat)
 
-    #set up flags and storage variables for previous rows
-    repeat_row_before = False
-    repeat_count = 0
-    instruction = ''
-
-    for n in range(len(pattern)):
-        #check if this row is one that gets repeated and stores it if it is
-        if len(pattern[n]) <= 2:
-            if repeat_row_before:
-                repeat_count += 1
-            repeat_row_before = True
-            for i in range((len(pattern[n]))):
-                stitch = pattern[n][i][0]
-                if stitch == 'k':
-                    num = pattern[n][i][1]
-                    instruction = f'{stitch}{num},'
+def segments_to_strarray(texts, segments, repeat: bool = True) -> list:
+    '''
+        Returns the instructions for the rows and repeats found by compress_texts(), as made by pattern_to_strarray().
+    '''
+    pattern_strarray = ['Instructions:']
+    for segment in segments:
+        if segment[0] == 'rows':
+            kind, first, count, row_id = segment
+            if count == 1:
+                pattern_strarray.append(f'Row {first+1}: {texts[row_id]}')
+            else:
+                pattern_strarray.append(f'Rows {first+1}-{first+count}: {texts[row_id]}')
         else:
-            #if the end of the repeated rows is reached, summarise them and add them to the return list
-            if repeat_row_before:
-                if repeat_count == 0:
-                    line = f'Row {n-1}: {instruction}'
-                    pattern_strarray.append(line)
-                else:
-                    end_repeat = n
-                    start_repeat = end_repeat-repeat_count
-                    repeated_rows = f'Rows {start_repeat}-{end_repeat}: {instruction}'
-                    pattern_strarray.append(repeated_rows)
-            #otherwise, read a row input list and turn it into a string of human-readable instructions
-            pattern_string = f'Row {n+1}: '
-            for i in range(len(pattern[n])):
-                row_n = len(pattern[n])
-                stitch = pattern[n][row_n-i-1][0]
-                if stitch == 'kyok' or stitch == 'sk2p':
-                    pattern_string += f'{stitch}, '
-                elif stitch == 'k':
-                    num = pattern[n][row_n-i-1][1]
-                    pattern_string += f'{stitch}{num}, '
-            repeat_row_before = False
-            repeat_count = 0
-            pattern_strarray.append(pattern_string)
-    pattern_strarray.append('Repeat from Row 1')
+            kind, first, last, times = segment
+            block = last - first + 1
+            plural = 'time' if times == 1 else 'times'
+            pattern_strarray.append(f'Repeat rows {first+1}-{last+1} {times} more {plural} (up to row {last+1 + block*times})')
+    if repeat:
+        pattern_strarray.append('Repeat from Row 1')
     return pattern_strarray 
 
+#rows collected before they are written to a file in one go
+WRITE_BATCH_ROWS = 512
+
+def format_rows(pattern, format_row):
+    '''
+    Yields format_row(row) for every row of a pattern (a Pattern, Garment or list of rows).
+    A Garment repeats the same rows, so each of them is only formatted once.
+    '''
+    if isinstance(pattern, Garment):
+        formatted = [format_row(row) for row in pattern.band.rows()]
+        for n in range(pattern.length):
+            yield formatted[n % len(formatted)]
+    else:
+        for row in as_pattern(pattern).rows():
+            yield format_row(row)
+
+def write_lines(file, lines) -> int:
+    '''
+    Writes lines (each ending in a newline) to a file, WRITE_BATCH_ROWS at a time.
+    Returns how many were written.
+    '''
+    written = 0
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= WRITE_BATCH_ROWS:
+            file.write(''.join(batch))
+            written += len(batch)
+            batch = []
+    file.write(''.join(batch))
+    return written + len(batch)
+
+def write_text(pattern, file) -> int:
+    '''
+    Writes the instructions for every row of a pattern to a file as plain text,
+    one row per line in the order it is knitted, e.g. 'Row 3: k2, sk2p, k2, kyok, '
+    Returns the number of rows written.
+    '''
+    texts = format_rows(pattern, row_instruction)
+    return write_lines(file, (f'Row {n+1}: {text}\n' for n, text in enumerate(texts)))
+
+def write_csv(pattern, file) -> int:
+    '''
+    Writes a pattern to a file as CSV with a (row, stitch, count) line for every run of stitches,
+    in the order they are knitted. Empty chart spaces are left out.
+    Returns the number of rows written.
+    '''
+    def format_row(row):
+        return [f',{stitch},{count}\n' for stitch, count in reversed(row) if stitch != ' ']
+    file.write('row,stitch,count\n')
+    runs = format_rows(pattern, format_row)
+    #every run of a row starts with the row number
+    return write_lines(file, (str(n+1) + str(n+1).join(row_runs) if row_runs else '' for n, row_runs in enumerate(runs)))
+
+def write_jsonl(pattern, file) -> int:
+    '''
+    Writes a pattern to a file as JSON Lines, one object per row, e.g.
+    {"row": 3, "stitches": [["k", 2], ["sk2p", 1], ["k", 2], ["kyok", 1]]}
+    with the stitches in the order they are knitted. Empty chart spaces are left out.
+    Returns the number of rows written.
+    '''
+    def format_row(row):
+        return json.dumps([[stitch, count] for stitch, count in reversed(row) if stitch != ' '])
+    stitches = format_rows(pattern, format_row)
+    return write_lines(file, (f'{{"row": {n+1}, "stitches": {row_json}}}\n' for n, row_json in enumerate(stitches)))
+
+#the writer for each file format
+WRITERS = {'text': write_text, 'csv': write_csv, 'jsonl': write_jsonl}
+
+def write_pattern(pattern, file, format: str = 'text') -> int:
+    '''
+    Writes a pattern to a file-like object in one of the WRITERS formats ('text', 'csv' or 'jsonl'),
+    one batch of rows at a time so large garments are never held in memory.
+    Returns the number of rows written.
+    '''
+    if format not in WRITERS:
+        raise ValueError(f'unknown pattern format {format!r}, expected one of {", ".join(WRITERS)}')
+    return WRITERS[format](pattern, file)
+
 
 if __name__ == '__main__':
     '''This was just used for testing'''
@@ -16,11 +16,36 @@ import pygame
 import asyncio
 import interactive
 import knitting
+import caching
+import scheduler
+import chart
+import symbols
+import worker
+import prefetch
+import assets
+import profiler
+import replay
+import time
 import sys
 
 
 WINDOW_HEIGHT = 800
 WINDOW_WIDTH = 1200
+FPS = 60 #highest frame rate
+SHOW_STATS = '--stats' in sys.argv #print frame-rate statistics on exit
+PROFILE = '--profile' in sys.argv #record timing spans from the start, and save them as a trace on exit
+TRACE_PATH = 'trace.json' #where F4 (or exiting with --profile) saves the timing spans, see profiler.py
+#with --record FILE, the input of every frame is saved to FILE, to be replayed by replay.py
+RECORD_PATH = sys.argv[sys.argv.index('--record') + 1] if '--record' in sys.argv[:-1] else None
+DIRTY_RECTS = True #only redraw and update the parts of the screen that changed
+CHART_MARGIN = 2 #space kept around the chart for its line weight
+LEGEND_SCALE = 20 #size of the symbols in the legend
+PAN_STEP = 40 #pixels the chart moves for each press of an arrow key
+GARMENT_PREVIEW = (200, 1000) #cast on and rows of the garment shown in the chart view
+#images only the pattern scene uses, loaded in the background after the first frame
+PATTERN_SCENE_IMAGES = ['Images/back.png', 'Images/back_hover.png']
+BACKGROUND_WORK = True #generate patterns and render charts a little at a time between frames, the browser has no threads
+WORK_BUDGET = 0.006 #seconds of background work done in each frame, so frames stay under 1/FPS
 
 YARN_TO_NEEDLESIZE = {
     '2 ply': '1.5 mm',
@@ -32,33 +57,131 @@ YARN_TO_NEEDLESIZE = {
     '14+ ply': '7mm'
 }
 
+#values offered by the sliders
+YARN_WEIGHTS = ['2 ply', '4 ply', '5 ply', '8 ply', '10 ply', '12 ply', '14+ ply']
+SPIKE_SIZES = [2, 3, 4, 5, 6, 7, 8]
+SPIKE_DISTANCES = [1, 2, 3, 4]
+
 
 class App:
     # Stores the different scenes and the settings for the GUI/initial loadstate.
     def __init__(self):
+        self.start_time = time.perf_counter()
+        self.first_frame_time = None # seconds from starting to showing the first frame
+        profiler.PROFILER.enabled = PROFILE
         pygame.init()
         self.screen = pygame.display.set_mode((WINDOW_WIDTH,WINDOW_HEIGHT))
-        self.scene_manager = SceneManager('setting', '8 ply',  4, 4)
+        #patterns and charts are made in small steps between frames, so the page keeps responding
+        self.worker = worker.FrameWorker() if BACKGROUND_WORK else None
+        self.scene_manager = SceneManager('setting', '8 ply',  4, 4, self.worker)
         self.setting_scene = Setting_Scene(self.screen, self.scene_manager)
         self.pattern_scene = Pattern_Scene(self.screen, self.scene_manager)
         self.scenes = {
             'setting': self.setting_scene,
             'pattern': self.pattern_scene
         }
+        #warms the caches for the settings near the current ones, while the settings scene is shown
+        if self.worker is not None:
+            self.prefetcher = prefetch.Prefetcher(self.scene_manager, SPIKE_SIZES, SPIKE_DISTANCES, self.pattern_scene.make_viewport)
+        else:
+            self.prefetcher = None
+        #finished background work only needs a frame drawn when the scene shows it (see work_done)
+        self.scheduler = scheduler.FrameScheduler(FPS, quiet_events=[worker.WORK_DONE])
+        self.recorder = replay.Recorder(RECORD_PATH, self.screen.get_size()) if RECORD_PATH else None
+        #held keys repeat every frame, so the chart view can be moved with the arrow keys
+        pygame.key.set_repeat(300, 1000 // FPS)
         # The logic of the scene manager is based on a tutorial by Coding with Sphere
         # https://www.youtube.com/watch?v=r0ixaTQxsUI
 
     async def run(self):
         #runs until window is closed.
+        #the scheduler caps the frame rate and waits for input instead of redrawing when nothing changes.
         running = True
         while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-            pygame.display.flip()
-            self.scenes[self.scene_manager.getScene()].run() 
-            await asyncio.sleep(0)
+            #keep the loop going without waiting for input until the background work is done
+            working = self.worker is not None and self.worker.busy() > 0
+            events = await self.scheduler.get_events_async(wait=not working)
+            self.frame(events, self.scheduler.should_draw())
+            #spend the rest of the frame's budget on background work, frames are only drawn for results that are shown
+            if self.worker is not None and self.worker.busy():
+                with profiler.span('background work'):
+                    self.worker.run_for(WORK_BUDGET)
+            await self.scheduler.tick_async()
+
+    def frame(self, events, draw):
+        '''
+        one pass of the main loop: handles the events, collects background work, and draws a frame when draw is true
+        (the scheduler decides when, replay.py draws every recorded frame)
+        '''
+        if self.recorder is not None:
+            self.recorder.add(events)
+        self.handle_events(events)
+        #collect what the background worker has finished
+        finished = self.scene_manager.collect_results()
+        if finished and self.scenes[self.scene_manager.getScene()].work_done(finished):
+            self.scheduler.wake()
+        #get the patterns the sliders could be moved to ready, while the worker has nothing else to do
+        if self.prefetcher is not None and self.scene_manager.getScene() == 'setting':
+            self.prefetcher.update(self.scene_manager.getHeight(), self.scene_manager.getDist())
+            self.prefetcher.step()
+        if draw:
+            scene = self.scene_manager.getScene()
+            rects = self.scenes[scene].run()
+            #the profiler's overlay goes on top of the scene
+            if profiler.PROFILER.show_overlay:
+                overlay = profiler.PROFILER.draw_overlay(self.screen, self.scene_manager.body)
+                if rects is not None:
+                    rects.append(overlay)
+            #push only the regions that changed to the display, or all of it after a full redraw
+            with profiler.span('display update'):
+                if rects is None:
+                    pygame.display.flip()
+                else:
+                    pygame.display.update(rects)
+            profiler.PROFILER.end_frame()
+            if self.recorder is not None:
+                self.recorder.end_frame()
+            if self.first_frame_time is None:
+                self.first_frame_time = time.perf_counter() - self.start_time
+                #what the first frame didn't need can be loaded now
+                if self.worker is not None:
+                    self.worker.submit(('assets',), self.scene_manager.assets.preload_steps, PATTERN_SCENE_IMAGES)
+            #draw all of the new scene after a scene change, and keep drawing so it settles
+            if scene != self.scene_manager.getScene():
+                self.scenes[self.scene_manager.getScene()].redraw()
+                self.scheduler.wake()
+
+    @profiler.timed('App.handle_events')
+    def handle_events(self, events):
+        #quits, or passes the frame's events to the profiler's keys or the current scene
+        for event in events:
+            if event.type == pygame.QUIT:
+                if SHOW_STATS:
+                    print(self.scheduler.report())
+                    print(f'first frame shown {self.first_frame_time*1000:.1f} ms after starting')
+                    print(self.scene_manager.assets.report())
+                if PROFILE:
+                    self.save_trace()
+                if self.recorder is not None:
+                    self.recorder.close()
+                if self.worker is not None:
+                    self.worker.stop()
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                #show or hide the profiler's overlay, the scene is drawn again to remove it
+                profiler.PROFILER.toggle_overlay()
+                self.scenes[self.scene_manager.getScene()].redraw()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                self.save_trace()
+            else:
+                self.scenes[self.scene_manager.getScene()].handle_event(event)
+
+    def save_trace(self):
+        #saves the timing spans recorded so far as a Chrome trace
+        if profiler.PROFILER.enabled:
+            spans = profiler.PROFILER.write_trace(TRACE_PATH)
+            print(f'{spans} timing spans saved to {TRACE_PATH}')
 
 class Setting_Scene:
     # The title and settings scene
@@ -67,55 +190,109 @@ class Setting_Scene:
     def __init__(self, screen, scene_manager):
         self.screen = screen  
         self.scene_manager = scene_manager
+        #every image comes from the scene manager's asset manager, which loads each of them once
+        images = self.scene_manager.assets
 
         #load background and title images
-        self.background_img = pygame.image.load('Images/background.jpg').convert()
-        self.title_img = pygame.image.load('Images/title.png').convert_alpha()
+        self.background_img = images.image('Images/background.jpg', alpha=False)
+        self.title_img = images.image('Images/title.png')
 
         #load button to generate a pattern
-        pattern_img = pygame.image.load('Images/pattern.png').convert_alpha()
-        pattern_hover_img = pygame.image.load('Images/pattern_hover.png').convert_alpha()
+        pattern_img = images.image('Images/pattern.png')
+        pattern_hover_img = images.image('Images/pattern_hover.png')
         self.pattern_button = interactive.Button(self.screen, WINDOW_WIDTH-390, WINDOW_HEIGHT-205, pattern_img, pattern_hover_img)
 
         #load picture of finished knit (a hat) and its collision area for its hoverstate
-        self.hat_img = pygame.image.load('Images/hat.png').convert_alpha()
+        self.hat_img = images.image('Images/hat.png')
         self.hat_area = pygame.Rect(55, WINDOW_HEIGHT-604, 600, 524)
-        self.hat_hover = pygame.transform.rotate(pygame.image.load('Images/hat.png').convert_alpha(), 6)
+        self.hat_hover = images.rotated('Images/hat.png', 6)
         
         #load slider to control the size of the yarn
-        s1_img = pygame.image.load('Images/slider1_img.png').convert_alpha()
-        s1_hover_img = pygame.image.load('Images/slider1_hover_img.png').convert_alpha()
-        s1_bar_img = pygame.image.load('Images/slider1_bar.png').convert_alpha()
-        s1_range = ['2 ply', '4 ply', '5 ply', '8 ply', '10 ply', '12 ply', '14+ ply']
+        s1_img = images.image('Images/slider1_img.png')
+        s1_hover_img = images.image('Images/slider1_hover_img.png')
+        s1_bar_img = images.image('Images/slider1_bar.png')
+        s1_range = YARN_WEIGHTS
         self.yarn_slider = interactive.Slider(self.screen, self.scene_manager,'Yarn Weight: ', 740, 235, s1_img, s1_hover_img, s1_bar_img, s1_range)
         
         #load slider to control the spikiness of the pattern
-        s2_img = pygame.image.load('Images/slider2_img.png').convert_alpha()
-        s2_hover_img = pygame.image.load('Images/slider2_hover_img.png').convert_alpha()
-        s2_bar_img = pygame.image.load('Images/slider2_bar.png').convert_alpha()
-        s2_range = [2, 3, 4, 5, 6, 7, 8]
+        s2_img = images.image('Images/slider2_img.png')
+        s2_hover_img = images.image('Images/slider2_hover_img.png')
+        s2_bar_img = images.image('Images/slider2_bar.png')
+        s2_range = SPIKE_SIZES
         self.height_slider = interactive.Slider(self.screen, self.scene_manager,'Spike Size: ', 740, 370, s2_img, s2_hover_img, s2_bar_img, s2_range)
         
         #load slider to control the distance between the spikes
-        s3_img = pygame.image.load('Images/slider3_img.png').convert_alpha()
-        s3_hover_img = pygame.image.load('Images/slider3_hover_img.png').convert_alpha()
-        s3_bar_img = pygame.image.load('Images/slider3_bar.png').convert_alpha()
-        s3_range = [1, 2, 3, 4]
+        s3_img = images.image('Images/slider3_img.png')
+        s3_hover_img = images.image('Images/slider3_hover_img.png')
+        s3_bar_img = images.image('Images/slider3_bar.png')
+        s3_range = SPIKE_DISTANCES
         self.dist_slider = interactive.Slider(self.screen, self.scene_manager, 'Spike Distance: ', 740, 505, s3_img, s3_hover_img, s3_bar_img, s3_range)
 
-    def run(self):
+        #the parts of the scene that never change, used to restore what's behind the hat and widgets
+        self.static_background = pygame.Surface(self.screen.get_size()).convert()
+        self.static_background.fill((255,255,255))
+        self.static_background.blit(self.background_img, (0, 0))
+        self.static_background.blit(self.title_img, (0, 15))
+        #area covered by either hat image
+        self.hat_draw_area = self.hat_img.get_rect(topleft=(55, WINDOW_HEIGHT-604)).union(self.hat_hover.get_rect(topleft=(20, WINDOW_HEIGHT-635)))
+        self.drawn_hat_hover = None
+
+        self.widgets = [self.yarn_slider, self.height_slider, self.dist_slider, self.pattern_button]
+        if DIRTY_RECTS:
+            for widget in self.widgets:
+                widget.background = self.static_background
+        #passes the mouse to the widgets
+        self.input = interactive.InputManager()
+        for widget in self.widgets:
+            self.input.add(widget)
+        self.full_redraw = True
+
+    def redraw(self):
         '''
-        function that draws the whole settings scene and manages interactivity/logic
+        makes the whole scene draw again next frame
         '''
-        self.screen.fill((255,255,255))
-        self.screen.blit(self.background_img, (0, 0))
-        self.screen.blit(self.title_img, (0, 15))
+        self.full_redraw = True
+        self.input.reset()
 
-        #display the hoverstate of the hat
-        if self.hat_area.collidepoint(pygame.mouse.get_pos()):
-            self.screen.blit(self.hat_hover, (20, WINDOW_HEIGHT-635))
-        else:
-            self.screen.blit(self.hat_img, (55, WINDOW_HEIGHT-604))
+    def handle_event(self, event):
+        '''
+        takes an event from the main loop and passes it to the widgets in this scene
+        '''
+        self.input.handle_event(event)
+
+    def work_done(self, finished):
+        '''
+        takes the kinds of background work that have finished, nothing in this scene waits for them
+        (they are prefetched for the pattern scene), so returns false: no frame needs to be drawn for them
+        '''
+        return False
+
+    @profiler.timed('Setting_Scene.run')
+    def run(self):
+        '''
+        function that draws the settings scene and manages interactivity/logic.
+        In dirty-rect mode only the parts that changed are drawn again.
+        Returns a list of the changed regions, or None when the whole scene was drawn.
+        '''
+        full_redraw = self.full_redraw
+        self.full_redraw = not DIRTY_RECTS
+        rects = []
+        if full_redraw:
+            self.screen.blit(self.static_background, (0, 0))
+            self.drawn_hat_hover = None
+            for widget in self.widgets:
+                widget.redraw()
+
+        #display the hoverstate of the hat, drawn again only when it changed
+        hat_hover = self.hat_area.collidepoint(self.input.pos)
+        if hat_hover != self.drawn_hat_hover:
+            self.screen.blit(self.static_background, self.hat_draw_area, self.hat_draw_area)
+            if hat_hover:
+                self.screen.blit(self.hat_hover, (20, WINDOW_HEIGHT-635))
+            else:
+                self.screen.blit(self.hat_img, (55, WINDOW_HEIGHT-604))
+            self.drawn_hat_hover = hat_hover
+            rects.append(self.hat_draw_area)
         
         #draws the sliders, sets the pattern params and passes them to the scene manager.
         yarn = self.yarn_slider.draw()
@@ -127,37 +304,179 @@ class Setting_Scene:
         if self.pattern_button.draw():
             self.scene_manager.setScene('pattern')
 
+        for widget in self.widgets:
+            rects += widget.get_dirty_rects()
+        if full_redraw:
+            return None
+        return rects
+
 class Pattern_Scene:
     # The scene displaying the final pattern and instructions on how to make it.
     def __init__(self, screen, scene_manager):
         self.screen = screen  
         self.scene_manager = scene_manager
 
-        #load back button to go back to settings scene.
-        back_img = pygame.image.load('Images/back.png').convert_alpha()
-        back_hover_img = pygame.image.load('Images/back_hover.png').convert_alpha()
+        #back button to go back to settings scene, made when the scene is first shown (see load)
+        self.back_button = None
+        self.input = interactive.InputManager()
+
+        #plain background of the page
+        self.background = pygame.Surface(self.screen.get_size()).convert()
+        self.background.fill((255,255,255))
+        #copy of what is drawn behind the back button (a zoomed-in chart can reach up behind it), restored when it changes
+        self.button_background = pygame.Surface(self.screen.get_size()).convert()
+        self.full_redraw = True
+
+        #zoomable view of the chart, made again when the pattern changes
+        self.viewport = None
+        self.view_entry = None
+        self.show_garment = False # show the pattern tiled across a whole garment
+        self.dragging = False
+        self.view_changed = False
+        self.waiting = False # the pattern is being generated in the background
+
+    def load(self):
+        '''
+        loads the back button's images (if they weren't loaded in the background already) and makes the button
+        '''
+        images = self.scene_manager.assets
+        back_img = images.image('Images/back.png')
+        back_hover_img = images.image('Images/back_hover.png')
         self.back_button = interactive.Button(self.screen, WINDOW_WIDTH-240, 22, back_img, back_hover_img)
+        if DIRTY_RECTS:
+            self.back_button.background = self.button_background
+        self.input.add(self.back_button)
 
-    def run(self):
+    def redraw(self):
         '''
-        function that draws the whole pattern scene and manages interactivity
+        makes the whole scene draw again next frame
         '''
-        #generate pattern based on parameters stored by the scene manager
-        bump_height = self.scene_manager.getHeight()
-        bump_distance = self.scene_manager.getDist()
-        pattern = knitting.generate_pattern(bump_height, bump_distance)
+        self.full_redraw = True
+        self.input.reset()
 
-        #draw the scene.
-        self.screen.fill((255,255,255))
-        self.draw_legend()
-        self.draw_instructions(pattern)
-        self.draw_pattern(pattern)
+    def handle_event(self, event):
+        '''
+        takes an event from the main loop and zooms or moves the chart view:
+        scroll the mouse wheel over the chart to zoom, drag it or use the arrow keys to move it,
+        +/- to zoom, G to switch between the pattern and a whole garment, and 0 to go back to the whole chart.
+        Mouse events used by the back button aren't used for the chart.
+        '''
+        if self.input.handle_event(event) or self.viewport is None:
+            return
+        view_rect = self.get_view_rect()
+        changed = False
+        if event.type == pygame.MOUSEWHEEL:
+            mouse = self.input.pos
+            if view_rect.collidepoint(mouse):
+                changed = self.viewport.zoom(event.y, (mouse[0] - view_rect.left, mouse[1] - view_rect.top))
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and view_rect.collidepoint(event.pos):
+            self.dragging = True
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self.dragging = False
+        elif event.type == pygame.MOUSEMOTION and self.dragging:
+            changed = self.viewport.pan(-event.rel[0], -event.rel[1])
+        elif event.type == pygame.KEYDOWN:
+            moves = {pygame.K_LEFT: (-PAN_STEP, 0), pygame.K_RIGHT: (PAN_STEP, 0), pygame.K_UP: (0, -PAN_STEP), pygame.K_DOWN: (0, PAN_STEP)}
+            if event.key in moves:
+                changed = self.viewport.pan(*moves[event.key])
+            elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                changed = self.viewport.zoom(1)
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                changed = self.viewport.zoom(-1)
+            elif event.key == pygame.K_0:
+                changed = self.viewport.zoom(-self.viewport.level)
+            elif event.key == pygame.K_g:
+                #the help text changes too
+                self.show_garment = not self.show_garment
+                self.viewport = None
+                self.redraw()
+        self.view_changed = self.view_changed or changed
+
+    def work_done(self, finished):
+        '''
+        takes the kinds of background work that have finished:
+        draws the page once the pattern is ready, and the chart view when tiles are ready.
+        Returns true when a frame needs to be drawn for them.
+        '''
+        redraw = False
+        if 'pattern' in finished and self.waiting:
+            self.redraw()
+            redraw = True
+        if 'tile' in finished:
+            self.view_changed = True
+            redraw = True
+        return redraw
+
+    @profiler.timed('Pattern_Scene.run')
+    def run(self):
+        '''
+        function that draws the pattern scene and manages interactivity.
+        The pattern part of the scene only changes when entering the scene or when the pattern is ready,
+        so in dirty-rect mode after that only the chart view (when it moves) and the back button are drawn again.
+        Returns a list of the changed regions, or None when the whole scene was drawn.
+        '''
+        if self.back_button is None:
+            self.load()
+        full_redraw = self.full_redraw
+        self.full_redraw = not DIRTY_RECTS
+        #get the pattern based on parameters stored by the scene manager
+        #(only generated again when the parameters change, None while it is generated in the background)
+        entry = self.scene_manager.getPattern()
+        self.waiting = entry is None
+        if full_redraw:
+            if entry is None:
+                self.draw_placeholder()
+            else:
+                self.draw_page(entry)
+                self.draw_view_help()
+            self.keep_behind_button(self.screen.get_rect())
+            self.back_button.redraw()
+        rects = []
+        if self.view_changed and not full_redraw and entry is not None:
+            #only the chart view moved, or more of it was rendered
+            chart_rect = self.draw_pattern(entry)
+            rects.append(chart_rect)
+            rects.append(self.draw_view_help())
+            #a zoomed-in chart reaches up behind the back button
+            if chart_rect.colliderect(self.back_button.draw_area):
+                self.keep_behind_button(chart_rect)
+                self.back_button.redraw()
+        self.view_changed = False
 
         #draws back button to go back to settings scene when pressed
         if self.back_button.draw():
             self.scene_manager.setScene('setting')
+            #start from the whole pattern next time, and stop working on this one
+            self.viewport = None
+            self.dragging = False
+            self.scene_manager.cancelWork()
+
+        rects += self.back_button.get_dirty_rects()
+        if full_redraw:
+            return None
+        return rects
 
 
+    def keep_behind_button(self, rect):
+        '''
+        copies what has just been drawn in rect, where it is behind the back button,
+        so the button restores it (instead of a plain background) when it is drawn again
+        '''
+        area = rect.clip(self.back_button.draw_area)
+        self.button_background.blit(self.screen, area, area)
+
+    @profiler.timed('Pattern_Scene.draw_page')
+    def draw_page(self, entry):
+        '''
+        function that draws everything in the scene except the back button:
+        the legend, the instructions and the chart for a pattern entry
+        '''
+        self.screen.blit(self.background, (0, 0))
+        self.draw_legend()
+        self.draw_instructions(entry.instructions)
+        self.draw_pattern(entry)
+
+    @profiler.timed('Pattern_Scene.draw_legend')
     def draw_legend(self):
         '''
         Function that draws 
@@ -167,133 +486,138 @@ class Pattern_Scene:
         '''
         # draw yarn size and recommended needle size
         yarn = self.scene_manager.getYarn()
-        yarn_desc = self.scene_manager.h2.render(f'Yarn: {yarn}', True, (0,0,0))
+        yarn_desc = self.scene_manager.text_cache.render(self.scene_manager.h2, f'Yarn: {yarn}', True, (0,0,0))
         self.screen.blit(yarn_desc, (50, 40))
-        needle_desc = self.scene_manager.h2.render(f'Suggested Needle Size: {YARN_TO_NEEDLESIZE[yarn]}', True, (0,0,0))
+        needle_desc = self.scene_manager.text_cache.render(self.scene_manager.h2, f'Suggested Needle Size: {YARN_TO_NEEDLESIZE[yarn]}', True, (0,0,0))
         self.screen.blit(needle_desc, (50, 70))
 
         #begin drawing the legend
-        legendtitle = self.scene_manager.h2.render('Diagram Legend', True, (0,0,0))
+        legendtitle = self.scene_manager.text_cache.render(self.scene_manager.h2, 'Diagram Legend', True, (0,0,0))
         self.screen.blit(legendtitle, (50, 115))
 
-        #draw knit symbol and meaning
-        rect = (50, 160, 20, 20)
-        pygame.draw.rect(self.screen, (0,0,0), rect, 2)
-        k1 = self.scene_manager.body.render('Knit one', True, (0,0,0))
-        self.screen.blit(k1, (130, 160))
-
-        # draw KYoK symbol and meaning
-        pygame.draw.line(self.screen, (0,0,0), (55, 199), (60,211), 2)
-        pygame.draw.line(self.screen, (0,0,0), (60, 199), (60,211), 2)
-        pygame.draw.line(self.screen, (0,0,0), (65, 199), (60,211), 2)
-        rect = (50, 195, 20, 20)
-        pygame.draw.rect(self.screen, (0,0,0), rect, 2)
-        kyok = self.scene_manager.body.render('KYoK: Knit one, yarn over', True, (0,0,0))
-        self.screen.blit(kyok, (130, 195))
-        kyok2 = self.scene_manager.body.render('knit one in same stitch', True, (0,0,0))
-        self.screen.blit(kyok2, (130, 215))
-
-        #draw SK2P symbol and meaning
-        pygame.draw.line(self.screen, (0,0,0), (80, 253), (60,265), 2)
-        pygame.draw.line(self.screen, (0,0,0), (80, 253), (80,265), 2)
-        pygame.draw.line(self.screen, (0,0,0), (80, 253), (100,265), 2)
-        rect = (49, 249, 22, 22)
-        pygame.draw.rect(self.screen, (0,0,0), rect, 2)
-        rect = (69, 249, 22, 22)
-        pygame.draw.rect(self.screen, (0,0,0), rect, 2)
-        rect = (89, 249, 22, 22)
-        pygame.draw.rect(self.screen, (0,0,0), rect, 2)
-        sk2p = self.scene_manager.body.render('SK2P: Slip one knitwise, knit two ', True, (0,0,0))
-        self.screen.blit(sk2p, (130, 250))
-        sk2p2 = self.scene_manager.body.render('together, pass slipped stitch over.', True, (0,0,0))
-        self.screen.blit(sk2p2, (130, 270))
-
-    def draw_instructions(self, pattern):
-        '''
-        function that takes a pattern and 
-        draws instructions for it, aligned to bottom left of screen
+        #the legend uses the same symbols as the chart
+        atlas = self.scene_manager.getGlyphs(LEGEND_SCALE)
+
+        #draw each symbol and its meaning, the same ones vector charts use (see symbols.py)
+        y = 160
+        for stitch, lines in symbols.STITCH_LEGEND:
+            self.screen.blit(atlas.get(stitch), atlas.position(50, y))
+            for no, line in enumerate(lines):
+                text = self.scene_manager.text_cache.render(self.scene_manager.body, line, True, (0,0,0))
+                self.screen.blit(text, (130, y + 20*no))
+            y += 15 + 20*len(lines)
+
+    @profiler.timed('Pattern_Scene.draw_instructions')
+    def draw_instructions(self, instructions):
+        '''
+        function that takes the instructions for a pattern (as made by knitting.pattern_to_strarray)
+        and draws them, aligned to bottom left of screen
         '''
         screen = self.screen
         h2 = self.scene_manager.h2
         body = self.scene_manager.body
-        instructions = knitting.pattern_to_strarray(pattern)
+        text_cache = self.scene_manager.text_cache
         starting_point = WINDOW_HEIGHT - len(instructions)*20 - 50
         for n in range(len(instructions)):
             if n == 0: #the first line is always the heading 'Instructions'
-                line = h2.render(instructions[n], True, (0,0,0))
+                line = text_cache.render(h2, instructions[n], True, (0,0,0))
                 screen.blit(line, (50, starting_point-20))
             else:
-                line = body.render(instructions[n], True, (0,0,0))
+                line = text_cache.render(body, instructions[n], True, (0,0,0))
                 screen.blit(line, (50, starting_point+n*20))
 
-    def draw_pattern(self, pattern):
+    def draw_placeholder(self):
         '''
-        function that takes a pattern and draws it from bottom right (row 1)
-        to top (last row), depending on stitch.
+        function that draws the page while the pattern is being generated
         '''
-        
-        screen = self.screen
-        #takes pattern height and width to scale pattern to window size
-        pattern_height = len(pattern)
-        pattern_width = pattern[0][0][1] + pattern[0][1][1] 
-        scale = 700/(max(pattern_height,pattern_width)) 
-
-        #for every row of the pattern...
-        for n in range(len(pattern)):
-            row = pattern[n]
-            #start from the bottom of the pattern area...
-            y = WINDOW_HEIGHT - scale * (n+1) -50  
-            x = WINDOW_WIDTH - 750
-            l_weight = 2 #line weight
-            ofst = l_weight/2 #offset squares to accomodate for line weight
-            # draw a box for every stitch in the pattern from left to right
-            # note: pattern is drawn left to right but read by human right to left.
-            for i in range(len(row)):
-                stitch = row[i][0]
-                count = row[i][1]
-                if stitch == ' ':
-                    x += scale * count
-                elif stitch == 'kyok':
-                    rect = pygame.Rect(x-ofst, y-ofst, scale + l_weight, scale + l_weight)
-                    pygame.draw.rect(screen, (0,0,0), rect , l_weight)
-                    pygame.draw.line(screen, (0,0,0), (x+scale/4, y+scale/4), (x+scale/2, y+scale*3/4), l_weight+1)
-                    pygame.draw.line(screen, (0,0,0), (x+scale*3/4, y+scale/4), (x+scale/2, y+scale*3/4), l_weight+1)
-                    pygame.draw.line(screen, (0,0,0), (x+scale/2, y+scale/4), (x+scale/2, y+scale*3/4), l_weight+1)
-                    x += scale
-                elif stitch == 'sk2p':
-                    pygame.draw.line(screen, (0,0,0), (x+scale*3/2, y+scale/4), (x+scale*5/2, y+scale*3/4), l_weight+1)
-                    pygame.draw.line(screen, (0,0,0), (x+scale*3/2, y+scale/4), (x+scale/2, y+scale*3/4), l_weight+1)
-                    pygame.draw.line(screen, (0,0,0), (x+scale*3/2, y+scale/4), (x+scale*3/2, y+scale*3/4), l_weight+1)
-                    rect = pygame.Rect(x-ofst, y-ofst, scale + l_weight, scale + l_weight)
-                    pygame.draw.rect(screen, (0,0,0), rect , l_weight)
-                    x += scale
-                    rect = pygame.Rect(x-ofst, y-ofst, scale + l_weight, scale + l_weight)
-                    pygame.draw.rect(screen, (0,0,0), rect , l_weight)
-                    x += scale
-                    rect = pygame.Rect(x-ofst, y-ofst, scale + l_weight, scale + l_weight)
-                    pygame.draw.rect(screen, (0,0,0), rect , l_weight)
-                    x += scale
-                elif stitch == 'k':
-                    for no in range(count):
-                        rect = pygame.Rect(x-ofst, y-ofst, scale + l_weight, scale + l_weight)
-                        pygame.draw.rect(screen, (0,0,0), rect , l_weight)
-                        x += scale
+        self.screen.blit(self.background, (0, 0))
+        view_rect = self.get_view_rect()
+        self.screen.fill(chart.PLACEHOLDER_COLOR, view_rect)
+        text = self.scene_manager.text_cache.render(self.scene_manager.h2, 'Generating the pattern...', True, (0,0,0))
+        self.screen.blit(text, text.get_rect(center=view_rect.center))
+
+    def draw_view_help(self):
+        '''
+        function that draws how to use the chart view below it,
+        or how much of it is still being rendered in the background.
+        Returns the rect drawn.
+        '''
+        view_rect = self.get_view_rect()
+        if self.viewport is not None and self.viewport.missing:
+            text = f'Drawing the chart... ({self.scene_manager.worker.busy()} parts left)'
+        else:
+            text = 'Scroll to zoom, drag or use the arrow keys to move, G: ' + ('back to the pattern' if self.show_garment else 'whole garment')
+        rect = pygame.Rect(view_rect.left, view_rect.bottom + 10, view_rect.width, 30)
+        self.screen.blit(self.background, rect, rect)
+        self.screen.blit(self.scene_manager.text_cache.render(self.scene_manager.body, text, True, (0,0,0)), rect)
+        return rect
+
+    def get_view_rect(self):
+        '''
+        function that returns the area of the screen the chart is shown in, above the bottom right corner of the window
+        '''
+        window_width, window_height = self.screen.get_size()
+        chart_size = min(window_width - 500, window_height - 100)
+        return pygame.Rect(window_width - 750, window_height - 50 - chart_size, chart_size, chart_size)
+
+    @profiler.timed('Pattern_Scene.draw_pattern')
+    def draw_pattern(self, entry):
+        '''
+        function that draws the chart for a pattern entry (see caching.PatternEntry), or the garment made from it,
+        through a zoomable chart.Viewport so only the part in view is drawn.
+        Parts of the chart that have been drawn before are kept by the scene manager as tiles.
+        Returns the rect drawn.
+        '''
+        view_rect = self.get_view_rect()
+        if self.viewport is None or self.view_entry is not entry or self.viewport.width != view_rect.width:
+            self.viewport = self.make_viewport(entry)
+            self.view_entry = entry
+        return self.viewport.draw(self.screen, view_rect.left, view_rect.top)
+
+    def make_viewport(self, entry):
+        '''
+        function that returns a new chart.Viewport for a pattern entry, or the garment made from it,
+        the same size as the chart area. Also used to prefetch the chart before the scene is shown.
+        '''
+        view_rect = self.get_view_rect()
+        if self.show_garment:
+            pattern = knitting.Garment(entry.b_height, entry.b_dist, *GARMENT_PREVIEW)
+        else:
+            pattern = entry.pattern
+        return chart.Viewport(pattern, (entry.b_height, entry.b_dist, self.show_garment), view_rect.width, view_rect.height,
+                              self.scene_manager.getTileGlyphs, self.scene_manager.tile_cache, self.scene_manager.worker)
 
 class SceneManager:
     '''
         Manages which scene is currently active.
-        Loads fonts and their settings.
+        Holds the asset manager the scenes load their images from.
+        Loads fonts and their settings, and keeps a cache of text rendered with them.
         Stores information passed between scenes.
+        Keeps caches of generated patterns and their charts so they aren't made again every frame.
+        With a worker (see worker.py), patterns are generated in the background and collected by the main loop.
     '''
-    def __init__(self, scene, yarn, bump_height, bump_dist):
+    def __init__(self, scene, yarn, bump_height, bump_dist, worker=None):
         self.scene = scene
         self.yarn = yarn
         self.bump_height = bump_height
         self.bump_dist = bump_dist
+        self.assets = assets.AssetManager()
         #load fonts
-        self.h1 = pygame.font.Font('Delius-Regular.ttf', 30)
-        self.h2 = pygame.font.Font('Delius-Regular.ttf', 24)
-        self.body = pygame.font.Font('Delius-Regular.ttf', 16)
+        self.h1 = self.assets.font('Delius-Regular.ttf', 30)
+        self.h2 = self.assets.font('Delius-Regular.ttf', 24)
+        self.body = self.assets.font('Delius-Regular.ttf', 16)
+        #all text is rendered through this cache
+        self.text_cache = caching.TextCache()
+        #cache of generated patterns, and the entry for the current settings
+        self.pattern_cache = caching.PatternCache()
+        self.pattern = None
+        #cache of pre-rendered tiles of pattern charts, for each zoom level
+        self.tile_cache = caching.TileCache()
+        #cache of stitch symbols for each chart scale
+        self.glyph_cache = caching.SurfaceCache()
+        #the symbols for chart tiles have their own cache, only used by whatever renders the tiles
+        self.tile_glyph_cache = caching.SurfaceCache()
+        self.worker = worker
 
     def getScene(self):
         return self.scene
@@ -310,7 +634,54 @@ class SceneManager:
     def getDist(self):
         return self.bump_dist
     
+    def getPattern(self):
+        #looks up the pattern for the current settings only after they have changed
+        if self.pattern is None:
+            if self.worker is None:
+                self.pattern = self.pattern_cache.get(self.bump_height, self.bump_dist)
+            else:
+                #returns None until the worker has generated it
+                self.pattern = self.pattern_cache.find(self.bump_height, self.bump_dist)
+                if self.pattern is None:
+                    key = (self.bump_height, self.bump_dist)
+                    self.worker.submit(('pattern',) + key, caching.PatternEntry, *key)
+        return self.pattern
+
+    def getGlyphs(self, scale):
+        #stitch symbols are only drawn once for each scale
+        return self.glyph_cache.get(scale, lambda: chart.GlyphAtlas(scale).convert())
+
+    def getTileGlyphs(self, scale):
+        #same as getGlyphs, for rendering chart tiles on the worker thread (converted in collect_results)
+        return self.tile_glyph_cache.get(scale, lambda: chart.GlyphAtlas(scale))
+
+    def collect_results(self):
+        #stores the patterns, chart tiles and images the worker has finished, returns the kinds of results
+        finished = set()
+        if self.worker is None:
+            return finished
+        for key, result in self.worker.get_results():
+            if key[0] == 'pattern':
+                self.pattern_cache.add(result)
+            elif key[0] == 'tile':
+                #tiles and their symbols are drawn without the display on the worker, and converted here on the main loop
+                self.tile_cache.level(key[1]).put(key[2], result.convert())
+                for atlas in list(self.tile_glyph_cache.entries.values()):
+                    atlas.convert()
+            elif key[0] == 'assets':
+                self.assets.add(result)
+            finished.add(key[0])
+        return finished
+
+    def cancelWork(self):
+        #drops background work that is no longer needed
+        if self.worker is not None:
+            self.worker.cancel()
+
     def setPattern(self, yarn, bump_height, bump_dist):
+        #look up the pattern again when the settings it is made from change (the yarn isn't one of them)
+        if (bump_height, bump_dist) != (self.bump_height, self.bump_dist):
+            self.pattern = None
         self.yarn = yarn
         self.bump_height = bump_height
         self.bump_dist = bump_dist 
@@ -0,0 +1,77 @@
+'''
+This file contains the prefetcher used by the settings scene.
+
+The sliders only offer a few spike sizes and distances, so while the user is looking at
+(or dragging) them, the app already knows which patterns are likely to be asked for next:
+the current settings and the ones a slider step or two away. The prefetcher generates those
+patterns and their instructions, and renders the charts of the nearest ones, in the background,
+so the pattern scene can be shown straight away when the pattern button is pressed.
+'''
+import heapq
+import caching
+
+PREFETCH_BUDGET = 16 #most patterns and charts prefetched for one set of settings
+PATTERN_RADIUS = 2 #patterns are prefetched for settings up to this many slider steps away
+CHART_RADIUS = 1 #charts are prefetched for settings up to this many slider steps away
+
+
+class Prefetcher():
+    '''
+        Warms the pattern and chart caches of a scene manager for the current settings and their neighbours.
+        Candidates are kept in a priority queue, nearest settings first and each pattern before its chart,
+        and at most budget of them are kept for each set of settings.
+        One candidate is handed to the worker at a time, and only when it has nothing else to do,
+        so prefetching never holds up work the user is waiting for.
+        make_viewport(entry) returns the chart.Viewport the pattern scene would show for a pattern entry.
+    '''
+    def __init__(self, scene_manager, sizes, distances, make_viewport, budget=PREFETCH_BUDGET):
+        self.scene_manager = scene_manager
+        self.sizes = list(sizes)
+        self.distances = list(distances)
+        self.make_viewport = make_viewport
+        self.budget = budget
+        self.settings = None
+        self.queue = [] # (slider steps away, 0 for a pattern or 1 for a chart, (size, distance))
+        #statistics
+        self.patterns = 0 # patterns handed to the worker
+        self.charts = 0 # charts handed to the worker
+
+    def update(self, b_height, b_dist):
+        '''
+            Starts prefetching around new settings, dropping what was left to do for the old ones.
+        '''
+        if (b_height, b_dist) == self.settings:
+            return
+        self.settings = (b_height, b_dist)
+        size_index = self.sizes.index(b_height)
+        dist_index = self.distances.index(b_dist)
+        candidates = []
+        for i, size in enumerate(self.sizes):
+            for j, dist in enumerate(self.distances):
+                steps = abs(i - size_index) + abs(j - dist_index)
+                if steps <= PATTERN_RADIUS:
+                    candidates.append((steps, 0, (size, dist)))
+                if steps <= CHART_RADIUS:
+                    candidates.append((steps, 1, (size, dist)))
+        #a sorted list is already a heap
+        self.queue = heapq.nsmallest(self.budget, candidates)
+
+    def step(self) -> bool:
+        '''
+            Hands the next candidate that isn't cached yet to the worker, if the worker is idle.
+            Returns true if it did.
+        '''
+        worker = self.scene_manager.worker
+        while self.queue and not worker.busy():
+            steps, kind, settings = heapq.heappop(self.queue)
+            entry = self.scene_manager.pattern_cache.find(*settings)
+            if kind == 0:
+                #the worker turns down a job that is pending or has failed, that doesn't count
+                if entry is None and worker.submit(('pattern',) + settings, caching.PatternEntry, *settings):
+                    self.patterns += 1
+                    return True
+            #a chart needs its pattern, which comes first unless it was cancelled
+            elif entry is not None and self.make_viewport(entry).prefetch():
+                self.charts += 1
+                return True
+        return False
@@ -0,0 +1,204 @@
+'''
+This file contains the frame profiler shared by both entry points (main.py and main_pygbag.py).
+
+Parts of the app are wrapped in named timing spans, with span() around a block or timed() on a function:
+the main loop's event handling and display updates, each scene's run and drawing functions,
+widget drawing, text rendering and pattern generation.
+Profiling is off unless it is turned on (with --profile, or F3 in the app), and while it is off a span costs
+one flag check. While it is on, every span is recorded, and the time spent in each one is added up per frame:
+the overlay shows the average and worst cost per frame of each span over the last ROLLING_FRAMES frames,
+and the recorded spans can be written out as a Chrome trace (JSON, open it in chrome://tracing or Perfetto).
+
+Dependencies: Pygame
+Install: python3 -m pip install -U pygame --user
+For more information: https://www.pygame.org/wiki/GettingStarted
+'''
+from collections import deque
+import functools
+import json
+import os
+import threading
+import time
+import pygame
+
+ROLLING_FRAMES = 60 #frames the overlay averages over
+MAX_TRACE_EVENTS = 200000 #most spans kept for the trace, the oldest ones are dropped first
+OVERLAY_LINES = 14 #most spans listed in the overlay, the most costly first
+OVERLAY_COLUMNS = (6, 300, 370) #left of the span names, and right of the average and worst costs, in pixels
+OVERLAY_COLOR = (255, 255, 224) #background of the overlay
+TEXT_COLOR = (0, 0, 0)
+
+
+class Span():
+    '''
+        Times a block of code as one span of a Profiler, used as a context manager.
+    '''
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class NullSpan():
+    '''
+        What span() returns while profiling is off: does nothing.
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = NullSpan()
+
+
+class Profiler():
+    '''
+        Records timing spans, keeps per-frame totals of each span for the overlay,
+        and writes the spans as a Chrome trace.
+        Spans can be recorded from any thread (e.g. the background worker), end_frame() is called by the main loop.
+    '''
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.show_overlay = False
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()
+        self.events = deque(maxlen=MAX_TRACE_EVENTS) # (name, start, seconds, thread id) of every span
+        self.frame = {} # name: seconds spent in that span this frame
+        self.history = deque(maxlen=ROLLING_FRAMES) # frame totals of the last frames
+        self.thread_names = {} # thread id: thread name, for the trace
+
+    def span(self, name):
+        '''
+            Returns a context manager timing the code inside it as a span called name.
+        '''
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def add(self, name, start, seconds):
+        '''
+            Records a span that started at start (time.perf_counter()) and took seconds.
+        '''
+        thread = threading.get_ident()
+        with self.lock:
+            self.events.append((name, start, seconds, thread))
+            self.frame[name] = self.frame.get(name, 0) + seconds
+            if thread not in self.thread_names:
+                self.thread_names[thread] = threading.current_thread().name
+
+    def end_frame(self):
+        '''
+            Ends the frame: its span totals are added to the rolling history shown by the overlay.
+        '''
+        if not self.enabled:
+            return
+        with self.lock:
+            self.history.append(self.frame)
+            self.frame = {}
+
+    def toggle_overlay(self):
+        '''
+            Shows or hides the overlay, turning profiling on when it is shown.
+        '''
+        self.show_overlay = not self.show_overlay
+        if self.show_overlay:
+            self.enabled = True
+
+    def rolling_costs(self) -> list:
+        '''
+            Returns (name, average ms per frame, worst ms in a frame) for every span over the last frames,
+            the most costly first.
+        '''
+        frames = len(self.history)
+        if frames == 0:
+            return []
+        totals = {}
+        worst = {}
+        for frame in self.history:
+            for name, seconds in frame.items():
+                totals[name] = totals.get(name, 0) + seconds
+                worst[name] = max(worst.get(name, 0), seconds)
+        costs = [(name, total / frames * 1000, worst[name] * 1000) for name, total in totals.items()]
+        return sorted(costs, key=lambda cost: -cost[1])
+
+    def draw_overlay(self, surface, font) -> pygame.Rect:
+        '''
+            Draws the rolling cost of every span in the top left corner of surface, over an opaque background
+            so it can be drawn again every frame. Returns the rect drawn.
+        '''
+        rows = [('span', 'avg ms', 'max ms')]
+        for name, average, worst in self.rolling_costs()[:OVERLAY_LINES]:
+            rows.append((name, f'{average:.2f}', f'{worst:.2f}'))
+        line_height = font.get_linesize()
+        name_x, average_x, worst_x = OVERLAY_COLUMNS
+        footer = font.render(f'last {len(self.history)} frames, F3 hides, F4 saves a trace', True, TEXT_COLOR)
+        rect = pygame.Rect(0, 0, max(worst_x, footer.get_width()) + 12, line_height * (OVERLAY_LINES + 2) + 8)
+        surface.fill(OVERLAY_COLOR, rect)
+        blits = []
+        for n, (name, average, worst) in enumerate(rows):
+            y = 4 + n * line_height
+            blits.append((font.render(name, True, TEXT_COLOR), (name_x, y)))
+            for text, right in ((average, average_x), (worst, worst_x)):
+                text = font.render(text, True, TEXT_COLOR)
+                blits.append((text, (right - text.get_width(), y)))
+        blits.append((footer, (name_x, rect.bottom - 4 - line_height)))
+        surface.blits(blits, doreturn=False)
+        return rect
+
+    def trace(self) -> dict:
+        '''
+            Returns the recorded spans in the Chrome trace event format, with times in microseconds.
+        '''
+        with self.lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+        pid = os.getpid()
+        trace_events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread, 'args': {'name': name}}
+                        for thread, name in thread_names.items()]
+        for name, start, seconds, thread in events:
+            trace_events.append({'name': name, 'cat': 'app', 'ph': 'X', 'pid': pid, 'tid': thread,
+                                 'ts': round((start - self.start_time) * 1e6, 1), 'dur': round(seconds * 1e6, 1)})
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, path) -> int:
+        '''
+            Writes the recorded spans to path as a Chrome trace. Returns the number of spans written.
+        '''
+        trace = self.trace()
+        with open(path, 'w') as file:
+            json.dump(trace, file)
+        return sum(1 for event in trace['traceEvents'] if event['ph'] == 'X')
+
+
+#the profiler used by the whole app
+PROFILER = Profiler()
+
+
+def span(name):
+    '''
+    Returns a context manager timing the code inside it as a span of the app's profiler.
+    '''
+    return PROFILER.span(name)
+
+
+def timed(name):
+    '''
+    Decorator that times every call of a function as a span of the app's profiler.
+    '''
+    def decorate(func):
+        @functools.wraps(func)
+        def timed_func(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with Span(PROFILER, name):
+                return func(*args, **kwargs)
+        return timed_func
+    return decorate
@@ -0,0 +1,188 @@
+'''
+Records input to a file while the app is used, and replays it headless to time the frames.
+
+Run the app with --record session.jsonl to record: every frame it draws is saved with the input events
+handled before it, where the mouse was and which buttons were held. Replaying runs the same sessions through
+App.frame (the main loop's own code) with SDL's dummy video driver, as fast as possible: a frame is drawn for
+every recorded frame, with nothing waited for in between, and patterns and charts are made on the main loop
+so every replay does the same work. The dummy driver has no mouse to move, so while a session is replayed,
+pygame.mouse.get_pos() and get_pressed() return the recorded ones. The frame-time percentiles of each session
+are reported, so rendering changes can be compared on identical workloads.
+
+A session is a JSON Lines file: a header line ({"version", "window", "mouse"}), and then a line for every frame,
+e.g. {"frame": 3, "time": 0.05, "mouse": [740, 390], "buttons": [1, 0, 0],
+       "events": [{"type": "MOUSEBUTTONDOWN", "pos": [740, 390], "button": 1}]}.
+
+Usage: python3 replay.py session.jsonl [...] [--repeat 3] [--out replay_results.json]
+
+Dependencies: Pygame
+Install: python3 -m pip install -U pygame --user
+For more information: https://www.pygame.org/wiki/GettingStarted
+'''
+import json
+import os
+import sys
+import time
+import pygame
+
+SESSION_VERSION = 1
+#the input events a session records, by the name of their pygame constant
+RECORDED_EVENTS = ['MOUSEMOTION', 'MOUSEBUTTONDOWN', 'MOUSEBUTTONUP', 'MOUSEWHEEL', 'KEYDOWN', 'KEYUP', 'TEXTINPUT', 'WINDOWLEAVE']
+EVENT_NAMES = {getattr(pygame, name): name for name in RECORDED_EVENTS}
+PERCENTILES = [50, 90, 95, 99]
+
+
+def event_to_dict(event) -> dict:
+    '''
+    Returns an input event as a dict that can be written as JSON, e.g. {"type": "KEYDOWN", "key": 43, ...}
+    '''
+    data = {'type': EVENT_NAMES[event.type]}
+    for name, value in event.dict.items():
+        if isinstance(value, (bool, int, float, str)):
+            data[name] = value
+        elif isinstance(value, tuple):
+            data[name] = list(value)
+    return data
+
+
+def dict_to_event(data) -> pygame.event.Event:
+    '''
+    Returns the event written by event_to_dict().
+    '''
+    attributes = {name: tuple(value) if isinstance(value, list) else value for name, value in data.items() if name != 'type'}
+    return pygame.event.Event(getattr(pygame, data['type']), attributes)
+
+
+class Recorder():
+    '''
+        Writes a session to a file as the app runs:
+        add() takes every batch of events the main loop gets, and end_frame() writes them when a frame is drawn.
+    '''
+    def __init__(self, path, window_size):
+        self.file = open(path, 'w')
+        self.start_time = time.perf_counter()
+        self.frames = 0
+        self.events = [] # events since the last frame was drawn
+        self.write({'version': SESSION_VERSION, 'window': list(window_size), 'mouse': list(pygame.mouse.get_pos())})
+
+    def write(self, line):
+        self.file.write(json.dumps(line) + '\n')
+
+    def add(self, events):
+        for event in events:
+            if event.type in EVENT_NAMES:
+                self.events.append(event_to_dict(event))
+
+    def end_frame(self):
+        '''
+            Writes a drawn frame with the events handled before it, and the mouse now.
+        '''
+        self.write({'frame': self.frames, 'time': round(time.perf_counter() - self.start_time, 4),
+                    'mouse': list(pygame.mouse.get_pos()), 'buttons': [int(held) for held in pygame.mouse.get_pressed()],
+                    'events': self.events})
+        self.frames += 1
+        self.events = []
+
+    def close(self):
+        self.file.close()
+
+
+def load_session(path) -> tuple:
+    '''
+    Reads a session file. Returns (header, frames), where every frame is (mouse position, buttons held, events).
+    '''
+    with open(path) as file:
+        header = json.loads(file.readline())
+        if header.get('version') != SESSION_VERSION:
+            raise ValueError(f'{path} is not a version {SESSION_VERSION} session')
+        frames = []
+        for line in file:
+            frame = json.loads(line)
+            events = [dict_to_event(data) for data in frame['events']]
+            frames.append((tuple(frame['mouse']), tuple(bool(held) for held in frame['buttons']), events))
+    if not frames:
+        raise ValueError(f'{path} has no frames')
+    return header, frames
+
+
+def percentile(times, p) -> float:
+    '''
+    Returns the p-th percentile of a sorted list of times (nearest rank).
+    '''
+    rank = max(1, -(-len(times) * p // 100))
+    return times[int(rank) - 1]
+
+
+def frame_stats(times) -> dict:
+    '''
+    Returns the frame count, mean, percentiles and worst of frame times, in milliseconds.
+    '''
+    times = sorted(times)
+    stats = {'frames': len(times), 'mean': sum(times) / len(times) * 1000}
+    for p in PERCENTILES:
+        stats[f'p{p}'] = percentile(times, p) * 1000
+    stats['max'] = times[-1] * 1000
+    return stats
+
+
+def replay_session(main, path) -> list:
+    '''
+    Replays a session through a new main.App, drawing every recorded frame. Returns the time taken by each frame.
+    '''
+    header, frames = load_session(path)
+    if tuple(header['window']) != (main.WINDOW_WIDTH, main.WINDOW_HEIGHT):
+        print(f'{path} was recorded in a {header["window"][0]}x{header["window"][1]} window, '
+              f'replaying it in {main.WINDOW_WIDTH}x{main.WINDOW_HEIGHT}')
+    #the widgets read the mouse when they are made and when a scene is shown
+    mouse = [tuple(header['mouse']), (False, False, False)]
+    get_pos = pygame.mouse.get_pos
+    get_pressed = pygame.mouse.get_pressed
+    pygame.mouse.get_pos = lambda: mouse[0]
+    pygame.mouse.get_pressed = lambda num_buttons=3: mouse[1]
+    try:
+        app = main.App()
+        times = []
+        for mouse[0], mouse[1], events in frames:
+            #the real event queue isn't used
+            pygame.event.clear()
+            start = time.perf_counter()
+            app.frame(events, True)
+            times.append(time.perf_counter() - start)
+    finally:
+        pygame.mouse.get_pos = get_pos
+        pygame.mouse.get_pressed = get_pressed
+        pygame.quit()
+    return times
+
+
+if __name__ == '__main__':
+    import argparse
+    #the app's fonts and images are relative to this folder
+    invoked_from = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    import main
+    #patterns and charts are made during the frame that needs them, so every replay does the same work
+    main.BACKGROUND_WORK = False
+
+    parser = argparse.ArgumentParser(description='Replay recorded sessions headless and report their frame times.')
+    parser.add_argument('sessions', nargs='+', help='session files recorded with main.py --record')
+    parser.add_argument('--repeat', type=int, default=1, help='replay each session this many times, keeping the fastest time of every frame')
+    parser.add_argument('--out', help='file to save the frame-time statistics to, as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    print(f'{"session":<28} {"frames":>6} {"mean":>7} ' + ' '.join(f'{"p"+str(p):>7}' for p in PERCENTILES) + f' {"max":>7}  (ms)')
+    for session in args.sessions:
+        path = os.path.join(invoked_from, session)
+        times = replay_session(main, path)
+        for n in range(args.repeat - 1):
+            times = [min(pair) for pair in zip(times, replay_session(main, path))]
+        stats = results[session] = frame_stats(times)
+        print(f'{os.path.basename(session)[:28]:<28} {stats["frames"]:>6} {stats["mean"]:>7.2f} '
+              + ' '.join(f'{stats["p"+str(p)]:>7.2f}' for p in PERCENTILES) + f' {stats["max"]:>7.2f}')
+    if args.out:
+        with open(os.path.join(invoked_from, args.out), 'w') as file:
+            json.dump(results, file, indent=1)
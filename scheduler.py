@@ -0,0 +1,133 @@
+'''
+This file contains the frame scheduler used by the main loop.
+It caps the frame rate and lets the app go idle (instead of redrawing as fast as possible)
+when nothing is happening, and keeps frame-rate and idle-time statistics.
+
+Dependencies: Pygame
+Install: python3 -m pip install -U pygame --user
+For more information: https://www.pygame.org/wiki/GettingStarted
+'''
+import pygame
+import asyncio
+import time
+
+
+class FrameScheduler():
+    '''
+        Decides when the main loop should redraw, and waits in between frames.
+        The scene is redrawn when input arrives, and for a few frames after that
+        so hover states, clicks and scene changes can settle. Otherwise the loop waits for events.
+        Events of the types in quiet_events (e.g. background work finishing) end the wait but don't cause a redraw,
+        the main loop calls wake() itself if they change what is shown.
+    '''
+    def __init__(self, fps=60, settle_frames=3, idle_wait=0.5, quiet_events=()):
+        self.fps = fps # highest frame rate
+        self.settle_frames = settle_frames # frames drawn after the last input
+        self.idle_wait = idle_wait # longest time (seconds) spent waiting for an event at once
+        self.quiet_events = set(quiet_events) # event types that don't wake the scheduler
+        self.clock = pygame.time.Clock()
+        self.frame_start = time.perf_counter()
+        self.awake = settle_frames # always draw the first frames
+        #statistics
+        self.start_time = time.perf_counter()
+        self.frames = 0 # frames drawn
+        self.skipped = 0 # loop passes that didn't draw anything
+        self.idle_time = 0 # seconds spent waiting for input
+
+    def wake(self, frames=None):
+        '''
+            Makes sure the next frames are drawn, e.g. after a scene change or during an animation.
+        '''
+        if frames is None:
+            frames = self.settle_frames
+        self.awake = max(self.awake, frames)
+
+    def get_events(self) -> list:
+        '''
+            Returns this frame's events like pygame.event.get(),
+            but blocks until an event arrives when there is nothing to draw.
+        '''
+        events = pygame.event.get()
+        if not events and self.awake == 0:
+            start = time.perf_counter()
+            event = pygame.event.wait(int(self.idle_wait * 1000))
+            self.idle_time += time.perf_counter() - start
+            if event.type != pygame.NOEVENT:
+                events = [event] + pygame.event.get()
+        self.wake_for(events)
+        return events
+
+    async def get_events_async(self, wait=True) -> list:
+        '''
+            Same as get_events, but sleeps the asyncio loop while idle instead of blocking,
+            so it can be used in the browser (pygbag) build.
+            When wait is false it doesn't wait for events, e.g. while there is background work to run between frames.
+        '''
+        events = pygame.event.get()
+        if not events and self.awake == 0 and wait:
+            start = time.perf_counter()
+            while not events and time.perf_counter() - start < self.idle_wait:
+                await asyncio.sleep(1/self.fps)
+                events = pygame.event.get()
+            self.idle_time += time.perf_counter() - start
+        self.wake_for(events)
+        return events
+
+    def wake_for(self, events):
+        '''
+            Wakes the scheduler if any of events is input, rather than one of the quiet events.
+        '''
+        for event in events:
+            if event.type not in self.quiet_events:
+                self.wake()
+                return
+
+    def should_draw(self) -> bool:
+        '''
+            Returns true when this frame needs to be drawn.
+        '''
+        if self.awake > 0:
+            self.awake -= 1
+            self.frames += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def tick(self):
+        '''
+            Waits for the rest of the frame, so the frame rate never goes above fps.
+        '''
+        self.clock.tick(self.fps)
+
+    async def tick_async(self):
+        '''
+            Same as tick, but sleeps the asyncio loop for the rest of the frame.
+        '''
+        frame_time = time.perf_counter() - self.frame_start
+        await asyncio.sleep(max(0, 1/self.fps - frame_time))
+        self.clock.tick() # only used to measure the frame rate here
+        self.frame_start = time.perf_counter()
+
+    def stats(self) -> dict:
+        '''
+            Returns frame-rate and idle-time statistics since the scheduler was created.
+        '''
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            'elapsed': elapsed,
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'average_fps': self.frames / elapsed if elapsed > 0 else 0,
+            'current_fps': self.clock.get_fps(),
+            'idle_time': self.idle_time,
+            'idle_fraction': self.idle_time / elapsed if elapsed > 0 else 0
+        }
+
+    def report(self) -> str:
+        '''
+            Returns the statistics as a human-readable string.
+        '''
+        stats = self.stats()
+        return (f"{stats['frames']} frames drawn in {stats['elapsed']:.1f}s "
+                f"({stats['average_fps']:.1f} fps average, {stats['current_fps']:.1f} fps now), "
+                f"{stats['skipped']} frames skipped, idle {stats['idle_fraction']*100:.0f}% of the time")
@@ -0,0 +1,275 @@
+'''
+Local HTTP service that renders pattern charts and instructions on request, e.g. for a web shop to embed.
+
+    GET /chart?yarn=8+ply&size=4&dist=2&format=png   the pattern page as drawn by the app (PNG),
+                                                      or with format=svg, the scalable chart (see vector.py)
+    GET /instructions?yarn=8+ply&size=4&dist=2        the instructions and stitches of every row, as JSON
+
+HEAD requests are answered too, with the headers a GET would get.
+
+Charts are rendered by a fixed-size pool of processes with SDL's dummy video driver, set up the same way
+as the batch exporter's (see export.py), so a burst of requests never starts more than --workers renders at once.
+Every response is kept in an in-memory cache and in a cache folder on disk (which also survives restarts),
+and has an ETag, so a repeat request is answered from memory, and a client that sends the ETag back
+gets a 304 Not Modified without a body. Cached files older than the sources they depend on are rendered again.
+
+Usage: python3 service.py [--port 8765] [--workers 2] [--cache service_cache]
+
+Dependencies: Pygame
+Install: python3 -m pip install -U pygame --user
+For more information: https://www.pygame.org/wiki/GettingStarted
+'''
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import argparse
+import export
+import hashlib
+import json
+import knitting
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+
+RESPONSE_CACHE_SIZE = 256 #most responses kept in memory
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml', 'json': 'application/json'}
+
+
+def instructions_json(yarn, b_height, b_dist) -> bytes:
+    '''
+    Returns the instructions for a pattern as JSON: the row by row instructions shown in the app,
+    and the stitches of every row in the order they are knitted (empty chart spaces left out).
+    '''
+    import main
+    pattern = knitting.generate_pattern(b_height, b_dist)
+    return json.dumps({
+        'yarn': yarn,
+        'needle_size': main.YARN_TO_NEEDLESIZE[yarn],
+        'spike_size': b_height,
+        'spike_distance': b_dist,
+        'width': pattern.width,
+        'rows': pattern.height,
+        'instructions': knitting.pattern_to_strarray(pattern),
+        'stitches': [[[stitch, count] for stitch, count in reversed(row) if stitch != ' '] for row in pattern],
+    }).encode()
+
+
+def init_worker():
+    '''
+    Sets up a render process as the exporter does, leaving Ctrl+C to the server, which stops the pool itself.
+    '''
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    export.init_worker()
+
+
+class Response():
+    '''
+        A cached response body with its content type and ETag.
+    '''
+    def __init__(self, body, content_type):
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+class ChartService():
+    '''
+        Makes and caches the service's responses.
+        Responses are looked up in memory, then on disk, and are only made when neither has them.
+        Each one is only made once at a time: a request for one that is being made waits for it.
+        Charts are rendered on a pool of worker processes, instructions on the request's thread.
+    '''
+    def __init__(self, cache_dir, workers=2):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.sources_mtime = export.newest_source_mtime()
+        self.pool = multiprocessing.Pool(workers, initializer=init_worker)
+        self.responses = OrderedDict() # file name: Response, least recently used first
+        self.making = {} # file name: event set when the response has been made
+        self.lock = threading.Lock()
+        #statistics
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.rendered = 0
+
+    def get(self, kind, yarn, b_height, b_dist, format) -> Response:
+        '''
+            Returns the response for a chart ('chart', in format 'png' or 'svg') or for instructions ('instructions').
+        '''
+        if kind == 'chart':
+            name = export.chart_filename(yarn, b_height, b_dist, format)
+        else:
+            name = export.chart_filename(yarn, b_height, b_dist, 'json').replace('chart_', 'instructions_')
+        while True:
+            with self.lock:
+                response = self.responses.get(name)
+                if response is not None:
+                    self.responses.move_to_end(name)
+                    self.memory_hits += 1
+                    return response
+                making = self.making.get(name)
+                if making is None:
+                    making = self.making[name] = threading.Event()
+                    break
+            #another request is making it, use theirs
+            making.wait()
+
+        try:
+            path = os.path.join(self.cache_dir, name)
+            if export.is_up_to_date(path, self.sources_mtime):
+                self.disk_hits += 1
+            else:
+                self.make(kind, yarn, b_height, b_dist, path)
+                self.rendered += 1
+            with open(path, 'rb') as file:
+                response = Response(file.read(), CONTENT_TYPES[name.rsplit('.', 1)[1]])
+            with self.lock:
+                self.responses[name] = response
+                if len(self.responses) > RESPONSE_CACHE_SIZE:
+                    self.responses.popitem(last=False)
+        finally:
+            with self.lock:
+                del self.making[name]
+            making.set()
+        return response
+
+    def make(self, kind, yarn, b_height, b_dist, path):
+        '''
+            Makes a response and saves it at path, through a temporary file so a half-written one is never served.
+        '''
+        stem, extension = os.path.splitext(path)
+        temporary = f'{stem}.part{threading.get_ident()}{extension}'
+        if kind == 'chart':
+            self.pool.apply(export.render_chart, ((yarn, b_height, b_dist, temporary),))
+        else:
+            with open(temporary, 'wb') as file:
+                file.write(instructions_json(yarn, b_height, b_dist))
+        os.replace(temporary, path)
+
+    def report(self) -> str:
+        '''
+            Returns the cache statistics as a human-readable string.
+        '''
+        return f'{self.memory_hits} responses from memory, {self.disk_hits} from disk, {self.rendered} made'
+
+    def close(self):
+        #let the workers exit on their own, SDL catches the signal Pool.terminate() would send
+        self.pool.close()
+        self.pool.join()
+
+
+def parse_settings(query) -> tuple:
+    '''
+    Takes the parsed query string of a request and returns (yarn, spike size, spike distance, format).
+    The yarn can be given with or without spaces, e.g. '8 ply' or '8ply'.
+    Raises ValueError when a setting is missing or isn't one the app offers.
+    '''
+    import main
+    def value(name, default=None):
+        values = query.get(name, [default])
+        if values[0] is None:
+            raise ValueError(f'missing {name}')
+        return values[0]
+    yarns = {weight.replace(' ', ''): weight for weight in main.YARN_WEIGHTS}
+    yarn = yarns.get(value('yarn').replace(' ', ''))
+    if yarn is None:
+        raise ValueError(f'yarn must be one of {", ".join(main.YARN_WEIGHTS)}')
+    b_height = value('size')
+    b_dist = value('dist')
+    try:
+        b_height = int(b_height)
+        b_dist = int(b_dist)
+    except ValueError:
+        raise ValueError('size and dist must be whole numbers')
+    if b_height not in main.SPIKE_SIZES or b_dist not in main.SPIKE_DISTANCES:
+        raise ValueError(f'size must be one of {main.SPIKE_SIZES} and dist one of {main.SPIKE_DISTANCES}')
+    format = value('format', 'png')
+    if format not in ('png', 'svg'):
+        raise ValueError('format must be png or svg')
+    return yarn, b_height, b_dist, format
+
+
+class ChartRequestHandler(BaseHTTPRequestHandler):
+    '''
+        Answers GET and HEAD requests for charts and instructions from the server's ChartService.
+        A HEAD request gets the same status and headers (including the ETag) as a GET, without the body.
+    '''
+    server_version = 'PatternService/1.0'
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        url = urlsplit(self.path)
+        kind = url.path.strip('/')
+        if kind not in ('chart', 'instructions'):
+            self.send_error(404, 'expected /chart or /instructions')
+            return
+        try:
+            settings = parse_settings(parse_qs(url.query))
+        except ValueError as error:
+            self.send_error(400, str(error))
+            return
+        try:
+            response = self.server.service.get(kind, *settings)
+        except Exception as error:
+            self.send_error(500, f'could not make the {kind}: {error}')
+            return
+
+        not_modified = self.headers.get('If-None-Match') == response.etag
+        self.send_response(304 if not_modified else 200)
+        self.send_header('ETag', response.etag)
+        #the response only changes when the app does, so clients can keep it as long as they check the ETag
+        self.send_header('Cache-Control', 'no-cache')
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header('Content-Type', response.content_type)
+        self.send_header('Content-Length', str(len(response.body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(response.body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(port, cache_dir, workers=2, verbose=False):
+    '''
+    Runs the service on localhost:port until interrupted.
+    '''
+    server = ThreadingHTTPServer(('127.0.0.1', port), ChartRequestHandler)
+    service = ChartService(cache_dir, workers)
+    server.service = service
+    server.verbose = verbose
+    print(f'serving charts on http://127.0.0.1:{port}/chart and /instructions with {workers} render workers')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    service.close()
+    print(service.report())
+
+
+if __name__ == '__main__':
+    #the service uses the fonts and images relative to this folder
+    invoked_from = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+    #loaded now rather than on the first request
+    import main
+
+    parser = argparse.ArgumentParser(description='Serve pattern charts and instructions over HTTP.')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on (default: 8765)')
+    parser.add_argument('--workers', type=int, default=2, help='number of render processes (default: 2)')
+    parser.add_argument('--cache', default='service_cache', help='folder to cache responses in')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+    serve(args.port, os.path.join(invoked_from, args.cache), args.workers, args.verbose)
@@ -0,0 +1,51 @@
+'''
+This file contains the definition of every stitch symbol: the lines drawn in its chart cells,
+and what it means in the legend.
+The on-screen charts and legend (chart.py, main.py) and the vector charts (vector.py) are all drawn from it,
+and row_cells() finds where each symbol of a row goes in a chart.
+'''
+import knitting
+
+STITCH_WIDTHS = knitting.STITCH_WIDTHS #how many chart cells each stitch covers
+
+#lines drawn in each stitch's symbol, as ((x1, y1), (x2, y2)),
+#measured in cells from the top left corner of its first cell.
+#every symbol also has a box around each cell it covers
+STITCH_SYMBOLS = {
+    'k': [],
+    'kyok': [((1/4, 1/4), (1/2, 3/4)),
+             ((3/4, 1/4), (1/2, 3/4)),
+             ((1/2, 1/4), (1/2, 3/4))],
+    'sk2p': [((3/2, 1/4), (5/2, 3/4)),
+             ((3/2, 1/4), (1/2, 3/4)),
+             ((3/2, 1/4), (3/2, 3/4))],
+}
+
+#the legend, in order: each stitch symbol and the lines of text explaining it
+STITCH_LEGEND = [
+    ('k', ['Knit one']),
+    ('kyok', ['KYoK: Knit one, yarn over', 'knit one in same stitch']),
+    ('sk2p', ['SK2P: Slip one knitwise, knit two ', 'together, pass slipped stitch over.']),
+]
+
+
+def row_cells(row, first=0, stop=None) -> list:
+    '''
+    Takes a row of (stitch, count) pairs and returns (cell, stitch) for every symbol in it,
+    where cell is how many cells from the left of the chart the symbol starts.
+    When first and stop are given, only symbols that cover one of the cells from first up to stop are returned.
+    '''
+    cells = []
+    x = 0
+    for stitch, count in row:
+        width = STITCH_WIDTHS[stitch]
+        if stitch == ' ' or (stop is not None and x >= stop) or x + count * width <= first:
+            x += count * width
+            continue
+        #a run of knit stitches only needs the ones that are in range
+        start = max(0, (first - x) // width - 1) if stitch == 'k' else 0
+        end = count if stop is None or stitch != 'k' else min(count, (stop - x) // width + 1)
+        for no in range(start, end):
+            cells.append((x + no * width, stitch))
+        x += count * width
+    return cells
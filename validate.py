@@ -0,0 +1,150 @@
+'''
+This file contains a stitch-count validator for generated knitting patterns.
+
+Every stitch uses up some stitches from the row below and leaves some on the needle for the row above
+(a kyok uses one and leaves three, an sk2p uses three and leaves one).
+A pattern is consistent when every row uses exactly the stitches the row below it left,
+so the validator turns a pattern into per-row arrays of stitches used and left,
+and checks whole patterns, or whole grids of patterns, in a few vectorised passes.
+
+Dependencies: NumPy
+Install: python3 -m pip install -U numpy --user
+For more information: https://numpy.org/install/
+'''
+import numpy as np
+import knitting
+import time
+
+#stitches used from the row below and left on the needle by each stitch
+STITCH_CONSUMES = {' ': 0, 'k': 1, 'kyok': 1, 'sk2p': 3}
+STITCH_PRODUCES = {' ': 0, 'k': 1, 'kyok': 3, 'sk2p': 1}
+#the same, indexed by the stitch codes used in knitting.Pattern
+CONSUMES = np.array([STITCH_CONSUMES[stitch] for stitch in knitting.STITCHES], dtype=np.int64)
+PRODUCES = np.array([STITCH_PRODUCES[stitch] for stitch in knitting.STITCHES], dtype=np.int64)
+
+
+def pattern_arrays(pattern) -> tuple:
+    '''
+    Returns the run arrays of a pattern as numpy arrays: (stitch codes, counts, row starts).
+    A Garment is checked through its tiled rows, which it repeats for its whole length.
+    '''
+    if isinstance(pattern, knitting.Garment):
+        pattern = pattern.band
+    pattern = knitting.as_pattern(pattern)
+    codes = np.frombuffer(pattern.codes, dtype=np.uint8)
+    counts = np.frombuffer(pattern.counts, dtype=np.uint32).astype(np.int64)
+    row_starts = np.frombuffer(pattern.row_starts, dtype=np.uint32).astype(np.int64)
+    return codes, counts, row_starts
+
+
+def stitch_counts(codes, counts, row_starts) -> tuple:
+    '''
+    Takes the run arrays of one or more patterns and returns (consumed, produced):
+    the number of stitches every row uses from the row below and leaves on the needle.
+    '''
+    rows = len(row_starts) - 1
+    #the row every run belongs to
+    run_rows = np.repeat(np.arange(rows), np.diff(row_starts))
+    consumed = np.bincount(run_rows, weights=CONSUMES[codes] * counts, minlength=rows).astype(np.int64)
+    produced = np.bincount(run_rows, weights=PRODUCES[codes] * counts, minlength=rows).astype(np.int64)
+    return consumed, produced
+
+
+def simulate(pattern) -> np.ndarray:
+    '''
+    Knits the pattern (a Pattern, Garment or list of rows) and returns
+    the number of stitches on the needle after every row.
+    '''
+    consumed, produced = stitch_counts(*pattern_arrays(pattern))
+    if isinstance(pattern, knitting.Garment):
+        return np.resize(produced, pattern.length)
+    return produced
+
+
+def check_rows(consumed, produced, first_rows, last_rows, repeat) -> list:
+    '''
+    Checks the stitch counts of the rows of one or more patterns stored one after the other,
+    where first_rows and last_rows are the first and last row of each pattern.
+    When repeat is true the first row of a pattern also has to follow on from its last row.
+    Returns a list of (pattern index, row index within the pattern, error message).
+    '''
+    errors = []
+    rows = len(consumed)
+    pattern_of_row = np.repeat(np.arange(len(first_rows)), last_rows - first_rows + 1)
+
+    #every row has to keep the stitch count the same, a kyok (+2) needs an sk2p (-2)
+    changed = np.nonzero(produced != consumed)[0]
+    for row in changed:
+        index = pattern_of_row[row]
+        errors.append((index, row - first_rows[index],
+                       f'row {row - first_rows[index] + 1} changes the stitch count by {produced[row] - consumed[row]:+d}'))
+
+    #every row has to use the stitches the row below left
+    below = np.arange(rows - 1)
+    follows = pattern_of_row[below] == pattern_of_row[below + 1]
+    broken = below[follows & (produced[below] != consumed[below + 1])]
+    if repeat:
+        #and the first row has to use the stitches the last row left
+        wrapped = first_rows[produced[last_rows] != consumed[first_rows]]
+    else:
+        wrapped = np.array([], dtype=np.int64)
+    for row in broken:
+        index = pattern_of_row[row]
+        errors.append((index, row + 1 - first_rows[index],
+                       f'row {row + 2 - first_rows[index]} uses {consumed[row + 1]} stitches but row {row + 1 - first_rows[index]} leaves {produced[row]}'))
+    for row in wrapped:
+        index = pattern_of_row[row]
+        last = last_rows[index]
+        errors.append((index, 0, f'row 1 uses {consumed[row]} stitches but the last row leaves {produced[last]}'))
+    return errors
+
+
+def validate_pattern(pattern, repeat: bool = True) -> list:
+    '''
+    Checks that a pattern (a Pattern, Garment or list of rows) is consistent.
+    When repeat is true (a single repeat from generate_pattern, or a Garment) the pattern has to follow on from itself.
+    Returns a list of error messages, empty when the pattern is fine.
+    '''
+    codes, counts, row_starts = pattern_arrays(pattern)
+    consumed, produced = stitch_counts(codes, counts, row_starts)
+    rows = len(consumed)
+    #a pattern without rows has nothing to check (and no last row to follow on from)
+    if rows == 0:
+        return []
+    errors = check_rows(consumed, produced, np.array([0]), np.array([rows - 1]), repeat)
+    return [message for index, row, message in sorted(errors, key=lambda error: error[1])]
+
+
+def validate_grid(heights, distances) -> dict:
+    '''
+    Generates and checks the pattern for every combination of the given spike sizes and distances at once.
+    Returns a dictionary of {(b_height, b_dist): list of error messages}.
+    '''
+    grid_heights, grid_distances = np.meshgrid(list(heights), list(distances), indexing='ij')
+    batch = knitting.generate_patterns(grid_heights, grid_distances)
+    settings = list(zip(batch.heights.tolist(), batch.distances.tolist()))
+
+    first_rows = batch.pattern_starts[:-1]
+    last_rows = batch.pattern_starts[1:] - 1
+
+    #the batch already has every pattern one after the other in one set of arrays
+    consumed, produced = stitch_counts(batch.codes, batch.counts, batch.row_starts)
+    results = {setting: [] for setting in settings}
+    for index, row, message in sorted(check_rows(consumed, produced, first_rows, last_rows, True), key=lambda error: error[:2]):
+        results[settings[index]].append(message)
+    return results
+
+
+if __name__ == '__main__':
+    #check that a pattern without rows is accepted, then every pattern the sliders can make, and a garment
+    assert validate_pattern([]) == [] and validate_pattern(knitting.Pattern()) == []
+    start = time.perf_counter()
+    results = validate_grid(range(2, 9), range(1, 5))
+    print(f'checked {len(results)} patterns in {(time.perf_counter() - start)*1000:.1f} ms')
+    for setting, errors in results.items():
+        for error in errors:
+            print(setting, error)
+    garment = knitting.Garment(8, 4, 400, 20000)
+    start = time.perf_counter()
+    errors = validate_pattern(garment)
+    print(f'checked a {garment.cast_on} x {garment.length} garment in {(time.perf_counter() - start)*1000:.1f} ms, {len(errors)} errors')
@@ -0,0 +1,270 @@
+'''
+This file contains writers for scalable vector knitting charts.
+
+write_svg() writes a whole chart as one SVG image, with the legend above it.
+write_pdf() writes a printable PDF that splits the chart into page-sized tiles,
+each labelled with its row and stitch numbers.
+
+Every stitch symbol (see symbols.py) is defined once per file and then reused for each stitch,
+and the chart is written a batch of rows at a time, so charts of any size, including a
+whole knitting.Garment, are exported without holding the chart in memory.
+Neither writer needs pygame.
+'''
+import knitting
+import symbols
+import zlib
+
+CELL_SIZE = 12 #size of one chart cell, in points (PDF) or pixels (SVG)
+LINE_WEIGHT = 1/12 #line weight of the stitch boxes as a part of a cell, symbols are drawn one and a half times as thick
+MARGIN = 36 #space around the chart, half an inch
+LABEL_SIZE = 7 #font size of the row and stitch numbers
+PAGE_SIZE = (595, 842) #A4 portrait, in points
+STITCH_LABEL_EVERY = 5 #stitch numbers are written above every 5th stitch
+
+
+def symbol_shapes(stitch, cell) -> tuple:
+    '''
+    Returns the shapes of a stitch symbol at a cell size, with the top left corner of its first cell at (0, 0)
+    and y going down: (boxes as (x, y, width, height), lines as ((x1, y1), (x2, y2))).
+    '''
+    boxes = [(cell * i, 0, cell, cell) for i in range(symbols.STITCH_WIDTHS[stitch])]
+    lines = [((cell * x1, cell * y1), (cell * x2, cell * y2)) for (x1, y1), (x2, y2) in symbols.STITCH_SYMBOLS[stitch]]
+    return boxes, lines
+
+
+def pattern_size(pattern) -> tuple:
+    '''
+    Returns (width, height) of a pattern's chart in cells.
+    '''
+    if isinstance(pattern, knitting.Garment):
+        return pattern.width, pattern.height
+    pattern = knitting.as_pattern(pattern)
+    return pattern.width, pattern.height
+
+
+def legend_spacing(lines, cell) -> float:
+    '''
+    Returns the height taken in the legend by a symbol explained by the given lines of text.
+    '''
+    return cell * (1.5 * len(lines) + 0.5)
+
+
+def escape(text) -> str:
+    '''
+    Escapes text for use in SVG.
+    '''
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def write_svg(pattern, file, title=None, cell=CELL_SIZE) -> int:
+    '''
+    Writes a pattern (a Pattern, Garment or list of rows) to a text file as an SVG chart,
+    drawn from row 1 at the bottom, with the row numbers on the right and the legend above it.
+    Returns the number of rows written.
+    '''
+    width, height = pattern_size(pattern)
+    line_weight = cell * LINE_WEIGHT
+    legend_height = sum(legend_spacing(lines, cell) for stitch, lines in symbols.STITCH_LEGEND)
+    top = MARGIN + (30 if title else 0) + legend_height
+    #width is kept for the row numbers and the legend text
+    image_width = max(MARGIN*2 + width * cell + LABEL_SIZE * 6, MARGIN*2 + 400)
+    image_height = top + height * cell + MARGIN
+
+    file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    file.write(f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+               f'width="{image_width:g}" height="{image_height:g}" viewBox="0 0 {image_width:g} {image_height:g}">\n')
+    #every symbol is defined once and used for every stitch
+    file.write('<defs>\n')
+    for stitch in symbols.STITCH_SYMBOLS:
+        boxes, lines = symbol_shapes(stitch, cell)
+        file.write(f'<g id="{stitch}" fill="none" stroke="black" stroke-width="{line_weight:g}">')
+        for x, y, w, h in boxes:
+            file.write(f'<rect x="{x:g}" y="{y:g}" width="{w:g}" height="{h:g}"/>')
+        for (x1, y1), (x2, y2) in lines:
+            file.write(f'<line x1="{x1:g}" y1="{y1:g}" x2="{x2:g}" y2="{y2:g}" stroke-width="{line_weight*1.5:g}"/>')
+        file.write('</g>\n')
+    file.write('</defs>\n')
+    file.write(f'<rect width="{image_width:g}" height="{image_height:g}" fill="white"/>\n')
+    file.write('<g font-family="sans-serif" fill="black">\n')
+
+    #title and legend
+    y = MARGIN
+    if title:
+        file.write(f'<text x="{MARGIN}" y="{y + 20}" font-size="20">{escape(title)}</text>\n')
+        y += 30
+    for stitch, lines in symbols.STITCH_LEGEND:
+        file.write(f'<use xlink:href="#{stitch}" x="{MARGIN}" y="{y:g}"/>')
+        for no, line in enumerate(lines):
+            file.write(f'<text x="{MARGIN + cell*4:g}" y="{y + cell*(1 + 1.5*no) - 2:g}" font-size="{cell:g}">{escape(line)}</text>')
+        file.write('\n')
+        y += legend_spacing(lines, cell)
+
+    #each row is drawn once with y = 0 and moved into place, so a garment's repeated rows are only formatted once
+    def format_row(row):
+        uses = ''.join(f'<use xlink:href="#{stitch}" x="{x * cell:g}"/>' for x, stitch in symbols.row_cells(row))
+        return uses + f'<text x="{width * cell + LABEL_SIZE:g}" y="{cell - (cell - LABEL_SIZE)/2:g}" font-size="{LABEL_SIZE}">'
+    bottom = top + height * cell
+    rows = knitting.format_rows(pattern, format_row)
+    written = knitting.write_lines(file, (f'<g transform="translate({MARGIN} {bottom - (n + 1) * cell:g})">{uses}{n + 1}</text></g>\n'
+                                          for n, uses in enumerate(rows)))
+    file.write('</g>\n</svg>\n')
+    return written
+
+
+class PDFWriter():
+    '''
+        Writes the objects of a PDF file one at a time, keeping only where each of them starts.
+        Object numbers are handed out by reserve(), so an object can be referred to before it is written.
+    '''
+    def __init__(self, file):
+        self.file = file
+        self.position = 0
+        self.offsets = {} # where each object starts in the file
+        self.next_object = 1
+        self.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def write(self, data):
+        self.file.write(data)
+        self.position += len(data)
+
+    def reserve(self) -> int:
+        '''
+            Returns the number of a new object.
+        '''
+        number = self.next_object
+        self.next_object += 1
+        return number
+
+    def add(self, number, dictionary, stream=None):
+        '''
+            Writes an object, given as the text of its dictionary, with an optional stream (bytes) that is compressed.
+        '''
+        self.offsets[number] = self.position
+        if stream is None:
+            self.write(f'{number} 0 obj\n{dictionary}\nendobj\n'.encode('latin-1'))
+        else:
+            stream = zlib.compress(stream)
+            self.write(f'{number} 0 obj\n<< {dictionary} /Filter /FlateDecode /Length {len(stream)} >>\nstream\n'.encode('latin-1'))
+            self.write(stream)
+            self.write(b'\nendstream\nendobj\n')
+
+    def close(self, root):
+        '''
+            Writes the cross-reference table and trailer, with root as the document catalog.
+        '''
+        xref = self.position
+        lines = [f'xref\n0 {self.next_object}\n', '0000000000 65535 f \n']
+        lines += [f'{self.offsets[number]:010d} 00000 n \n' for number in range(1, self.next_object)]
+        lines.append(f'trailer\n<< /Size {self.next_object} /Root {root} 0 R >>\nstartxref\n{xref}\n%%EOF\n')
+        self.write(''.join(lines).encode('latin-1'))
+
+
+def pdf_text(x, y, size, text, align='left') -> str:
+    '''
+    Returns the PDF operators that write a line of text in Helvetica, starting (or ending, for align='right') at (x, y).
+    '''
+    text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    if align == 'right':
+        #close enough for the digits used in labels, which are all 0.556 em wide in Helvetica
+        x -= len(text) * size * 0.556
+    return f'BT /F1 {size:g} Tf {x:g} {y:g} Td ({text}) Tj ET\n'
+
+
+def write_pdf(pattern, file, title=None, cell=CELL_SIZE, page_size=PAGE_SIZE) -> int:
+    '''
+    Writes a pattern (a Pattern, Garment or list of rows) to a binary file as a printable PDF chart.
+    The first page has the title and legend. The chart is split into page-sized tiles, one per page,
+    starting from row 1 at the bottom right as it is knitted, and every tile is labelled
+    with its row numbers on the right and stitch numbers (counted from the right) below.
+    Returns the number of pages written.
+    '''
+    width, height = pattern_size(pattern)
+    page_width, page_height = page_size
+    line_weight = cell * LINE_WEIGHT
+    #cells that fit on a page, leaving room for the labels and the header
+    page_columns = max(1, int((page_width - MARGIN*2 - LABEL_SIZE * 4) // cell))
+    page_rows = max(1, int((page_height - MARGIN*2 - LABEL_SIZE * 2 - 20) // cell))
+    tiles = [(first_row, first_column)
+             for first_row in range(0, height, page_rows)
+             #stitches are knitted from the right
+             for first_column in reversed(range(0, width, page_columns))]
+
+    pdf = PDFWriter(file)
+    catalog = pdf.reserve()
+    pages = pdf.reserve()
+    font = pdf.reserve()
+    pdf.add(catalog, f'<< /Type /Catalog /Pages {pages} 0 R >>')
+    pdf.add(font, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+    #every symbol is a form, drawn with its bottom left corner at (0, 0)
+    forms = {}
+    for no, stitch in enumerate(symbols.STITCH_SYMBOLS):
+        boxes, lines = symbol_shapes(stitch, cell)
+        operators = [f'{line_weight:g} w\n']
+        operators += [f'{x:g} {cell - y - h:g} {w:g} {h:g} re S\n' for x, y, w, h in boxes]
+        operators.append(f'{line_weight*1.5:g} w 1 J\n')
+        operators += [f'{x1:g} {cell - y1:g} m {x2:g} {cell - y2:g} l S\n' for (x1, y1), (x2, y2) in lines]
+        number = pdf.reserve()
+        symbol_width = boxes[-1][0] + cell
+        pdf.add(number, f'/Type /XObject /Subtype /Form /BBox [{-line_weight:g} {-line_weight:g} {symbol_width + line_weight:g} {cell + line_weight:g}]',
+                ''.join(operators).encode('latin-1'))
+        forms[stitch] = (f'S{no}', number)
+    resources = ('<< /Font << /F1 %d 0 R >> /XObject << %s >> >>'
+                 % (font, ' '.join(f'/{name} {number} 0 R' for name, number in forms.values())))
+
+    page_numbers = []
+    def add_page(operators):
+        contents = pdf.reserve()
+        pdf.add(contents, '', ''.join(operators).encode('latin-1'))
+        number = pdf.reserve()
+        pdf.add(number, f'<< /Type /Page /Parent {pages} 0 R /MediaBox [0 0 {page_width:g} {page_height:g}] '
+                        f'/Resources {resources} /Contents {contents} 0 R >>')
+        page_numbers.append(number)
+
+    #first page: title, chart size and legend
+    y = page_height - MARGIN - 20
+    operators = []
+    if title:
+        operators.append(pdf_text(MARGIN, y, 20, title))
+        y -= 30
+    operators.append(pdf_text(MARGIN, y, 12, f'{height} rows of {width} stitches, charted on {len(tiles)} page(s). '
+                                             f'Start from row 1 at the bottom right.'))
+    y -= 40
+    for stitch, lines in symbols.STITCH_LEGEND:
+        operators.append(f'q 1 0 0 1 {MARGIN:g} {y - cell:g} cm /{forms[stitch][0]} Do Q\n')
+        for no, line in enumerate(lines):
+            operators.append(pdf_text(MARGIN + cell*4, y - cell*(1 + 1.5*no) + 2, cell, line))
+        y -= legend_spacing(lines, cell)
+    add_page(operators)
+
+    left = MARGIN
+    bottom = MARGIN + LABEL_SIZE * 2
+    for page, (first_row, first_column) in enumerate(tiles):
+        last_row = min(first_row + page_rows, height)
+        last_column = min(first_column + page_columns, width)
+        operators = [pdf_text(left, page_height - MARGIN - 12, 12,
+                              f'{title + " - " if title else ""}Rows {first_row + 1}-{last_row}, '
+                              f'stitches {width - last_column + 1}-{width - first_column} (page {page + 2} of {len(tiles) + 1})')]
+
+        #row numbers on the right, stitch numbers below
+        label_x = left + (last_column - first_column) * cell + LABEL_SIZE
+        for n in range(first_row, last_row):
+            operators.append(pdf_text(label_x, bottom + (n - first_row) * cell + (cell - LABEL_SIZE)/2 + 1, LABEL_SIZE, str(n + 1)))
+        for column in range(first_column, last_column):
+            stitch_no = width - column
+            if stitch_no % STITCH_LABEL_EVERY == 0 or column in (first_column, last_column - 1):
+                operators.append(pdf_text(left + (column - first_column + 1) * cell - 1, bottom - LABEL_SIZE - 2, LABEL_SIZE, str(stitch_no), 'right'))
+
+        #the symbols, cut off at the edges of the tile
+        operators.append(f'q {left - line_weight:g} {bottom - line_weight:g} {(last_column - first_column) * cell + line_weight*2:g} '
+                         f'{(last_row - first_row) * cell + line_weight*2:g} re W n\n')
+        for n in range(first_row, last_row):
+            y = bottom + (n - first_row) * cell
+            for x, stitch in symbols.row_cells(pattern[n], first_column, last_column):
+                operators.append(f'q 1 0 0 1 {left + (x - first_column) * cell:g} {y:g} cm /{forms[stitch][0]} Do Q\n')
+        operators.append('Q\n')
+        add_page(operators)
+
+    pdf.add(pages, f'<< /Type /Pages /Kids [{" ".join(f"{number} 0 R" for number in page_numbers)}] /Count {len(page_numbers)} >>')
+    pdf.close(catalog)
+    return len(page_numbers)
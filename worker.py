@@ -0,0 +1,198 @@
+'''
+This file contains the background worker used by the desktop app, so slow work
+(generating patterns and laying out their instructions, rendering chart tiles)
+doesn't stop the main loop from handling events and drawing.
+
+Jobs are run one at a time on a worker thread. Their results are put on a queue,
+and a WORK_DONE event is posted so the main loop wakes up and collects them.
+Cancelling drops every job that hasn't finished, e.g. when the user leaves the pattern scene.
+A job that raises an exception is reported and skipped, so one bad job never stops the app.
+
+The browser (pygbag) build has no threads, so it uses a FrameWorker instead, which runs jobs
+on the main loop a step at a time, for a fixed time budget between frames.
+A job can be a generator function that yields after every chunk of work (e.g. a few rows of a chart tile)
+and returns its result, so no single step takes long.
+
+Dependencies: Pygame
+Install: python3 -m pip install -U pygame --user
+For more information: https://www.pygame.org/wiki/GettingStarted
+'''
+import pygame
+import inspect
+import profiler
+import queue
+import threading
+import time
+
+#posted to the event queue whenever a job finishes
+WORK_DONE = pygame.event.custom_type()
+
+
+def run_job(func, args):
+    '''
+    Runs func(*args) and returns its result.
+    When func is a generator function, its steps are all run and its return value is the result.
+    '''
+    result = func(*args)
+    if inspect.isgenerator(result):
+        try:
+            while True:
+                next(result)
+        except StopIteration as done:
+            result = done.value
+    return result
+
+
+class Worker():
+    '''
+        Runs jobs on a background thread and hands their results back through a queue.
+        Each job has a key, and a job isn't submitted again while one with the same key is pending,
+        or after one with the same key has failed (until the next cancel()).
+        submit, cancel and get_results are only called from the main loop.
+    '''
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.generation = 0 # jobs submitted before the last cancel() have an older generation
+        self.pending = {} # generation of every job that has been submitted but not collected
+        self.failed = {} # exception raised by every job that has failed since the last cancel()
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    def submit(self, key, func, *args) -> bool:
+        '''
+            Queues func(*args) to run on the worker thread, unless a job with this key is already pending or has failed.
+            Returns true if the job was queued.
+        '''
+        if key in self.pending or key in self.failed:
+            return False
+        self.pending[key] = self.generation
+        self.jobs.put((self.generation, key, func, args))
+        return True
+
+    def is_pending(self, key) -> bool:
+        return key in self.pending
+
+    def busy(self) -> int:
+        '''
+            Returns the number of jobs that haven't been collected yet.
+        '''
+        return len(self.pending)
+
+    def cancel(self):
+        '''
+            Drops every queued job, and the result of the one running now. Failed jobs can be submitted again.
+        '''
+        self.generation += 1
+        self.pending.clear()
+        self.failed.clear()
+        while True:
+            try:
+                self.jobs.get_nowait()
+            except queue.Empty:
+                break
+
+    def work(self):
+        '''
+            Runs on the worker thread: runs each job that hasn't been cancelled and queues its result.
+        '''
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            generation, key, func, args = job
+            if generation != self.generation:
+                continue
+            try:
+                with profiler.span('job ' + str(key[0])):
+                    result = run_job(func, args)
+            except Exception as error:
+                result = error
+            self.results.put((generation, key, result))
+            pygame.event.post(pygame.event.Event(WORK_DONE))
+
+    def get_results(self) -> list:
+        '''
+            Returns (key, result) for every job that has finished since the last call, leaving out cancelled ones.
+            A job that raised an exception is left out too: it is printed and kept in failed instead.
+        '''
+        results = []
+        while True:
+            try:
+                generation, key, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation:
+                continue
+            self.pending.pop(key, None)
+            if isinstance(result, Exception):
+                self.failed[key] = result
+                print(f'background job {key} failed: {result!r}')
+                continue
+            results.append((key, result))
+        return results
+
+    def stop(self):
+        '''
+            Stops the worker thread once it has finished its current job.
+        '''
+        self.cancel()
+        self.jobs.put(None)
+
+
+class FrameWorker(Worker):
+    '''
+        A Worker without a thread, for the browser build.
+        Jobs are run on the main loop by run_for(), a step (one yield of a generator function) at a time,
+        until the time budget for the frame is used up, so a large job is spread over many frames.
+    '''
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.generation = 0
+        self.pending = {}
+        self.failed = {}
+        self.current = None # (generation, key, steps) of the job that has been started but not finished
+
+    def cancel(self):
+        super().cancel()
+        self.current = None
+
+    def run_for(self, budget) -> int:
+        '''
+            Runs jobs for about budget seconds: stops after the step that goes over it, or when there are no jobs left.
+            Returns the number of steps run.
+        '''
+        start = time.perf_counter()
+        steps = 0
+        while time.perf_counter() - start < budget:
+            if self.current is None:
+                try:
+                    generation, key, func, args = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if generation != self.generation:
+                    continue
+                try:
+                    result = func(*args)
+                except Exception as error:
+                    result = error
+                steps += 1
+                if not inspect.isgenerator(result):
+                    self.results.put((generation, key, result))
+                    continue
+                self.current = (generation, key, result)
+            generation, key, job = self.current
+            try:
+                next(job)
+            except StopIteration as done:
+                self.current = None
+                self.results.put((generation, key, done.value))
+            except Exception as error:
+                self.current = None
+                self.results.put((generation, key, error))
+            steps += 1
+        return steps
+
+    def stop(self):
+        self.cancel()